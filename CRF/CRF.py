@@ -1,12 +1,20 @@
+import os
 import json
-from collections import namedTuple
+import zlib
+import types
+import shutil
+import hashlib
+import tempfile
+import multiprocessing
+from collections import deque
+from itertools import islice
 
-import pycrfsuite
-
-Feature = namedTuple('Feature', 'idx count')
+import numpy as np
 
 bos = 'BOS'
 eos = 'EOS'
+# 품사 판별 시 아직 정해지지 않은 앞 단어의 품사 자리에 넣는 표시
+unknown_tag = '\x00'
 
 class AbstractFeatureTransformer:
     """Feature transformer가 상속하는 abstract class"""
@@ -27,6 +35,11 @@ class AbstractFeatureTransformer:
         encoded_sentence = self.potential_function(words_, tags_)
         return  encoded_sentence, tags
 
+    def sentence_to_ids(self, sentence, vocabulary):
+        """sentence_to_xy와 같으나 단어별 feature를 vocabulary의 정수 id 배열로 변환"""
+        sentence_, tags = self.sentence_to_xy(sentence)
+        return vocabulary.encode_sentence(sentence_), tags
+
     def potential_function(self, words_, tags_):
         n = len(tags_) - 2 # except bos & eos
         sentence_ = [self.to_feature(words_, tags_, i) for i in range(1, n+1)]
@@ -66,74 +79,455 @@ class HMMStyleFeatureTransformer(AbstractFeatureTransformer):
         ]
         return features
 
+def _is_word_feature(feature):
+    return feature[:4] == 'x[0]' and not ', ' in feature
+
+def _trim(counter, min_count):
+    return {
+        feature:count for feature, count in counter.items()
+        # 최소 등장 횟수 넘거나 단어 자체만 기억
+        if (count >= min_count) or _is_word_feature(feature)
+    }
+
+def _count_batches(sentences, sentence_to_xy, batch_size):
+    """batch_size개의 문장마다 그 안에서 센 feature 빈도 dict를 yield"""
+    counter = {}
+    for i, sentence in enumerate(sentences):
+        # 문장을 feature로 변환
+        sentence_, _ = sentence_to_xy(sentence)
+        for features in sentence_:
+            for feature in features:
+                counter[feature] = counter.get(feature, 0) + 1
+        if (i + 1) % batch_size == 0:
+            yield counter
+            counter = {}
+    if counter:
+        yield counter
+
+def count_features(batches, min_count, sketch_width=2**22, sketch_depth=4):
+    """(feature 리스트, 등장 횟수 리스트) batch들을 합산하고 최소 등장 횟수 미만의
+    feature를 자름. batch 안의 feature는 서로 달라야 한다.
+
+    batches는 batch들을 yield하는 iterable을 리턴하는 함수이다. sketch_width가
+    0보다 크면 batches를 두 번 호출한다. 첫 번째는 count-min sketch로 등장 횟수를
+    근사하고, 두 번째는 근사 횟수가 min_count 이상인 feature만 정확히 센다.
+    sketch는 실제보다 적게 세지 않으므로 결과는 전체를 정확히 센 뒤 자른 것과
+    같다. sketch_width가 0이면 sketch 없이 모든 feature를 한 번에 센다.
+    """
+    counter = {}
+    if not sketch_width:
+        for features, counts in batches():
+            for feature, count in zip(features, counts):
+                counter[feature] = counter.get(feature, 0) + count
+        return _trim(counter, min_count)
+
+    sketch = CountMinSketch(sketch_width, sketch_depth)
+    for features, counts in batches():
+        sketch.update(features, counts)
+
+    for features, counts in batches():
+        estimates = sketch.estimate(features).tolist()
+        for feature, count, estimate in zip(features, counts, estimates):
+            if estimate >= min_count or _is_word_feature(feature):
+                counter[feature] = counter.get(feature, 0) + count
+
+    # sketch의 충돌로 살아남은 feature 제거
+    return _trim(counter, min_count)
+
+class FeatureVocabulary:
+    """feature 문자열과 정수 id의 대응
+
+    n_buckets가 주어지면 feature 문자열을 저장하지 않고 hashing trick으로
+    각 feature를 n_buckets개의 id 중 하나로 대응시킨다. 해시는 프로세스와
+    무관하게 같은 값을 갖도록 crc32를 이용한다.
+    """
+    def __init__(self, idx2feature=None, n_buckets=0):
+        self.n_buckets = n_buckets
+        self.idx2feature = [] if n_buckets else list(idx2feature or [])
+        self.feature2idx = {feature:idx for idx, feature in enumerate(self.idx2feature)}
+
+    def __len__(self):
+        return self.n_buckets or len(self.idx2feature)
+
+    def add(self, feature):
+        if self.n_buckets:
+            return self.get(feature)
+        idx = self.feature2idx.get(feature)
+        if idx is None:
+            idx = len(self.idx2feature)
+            self.feature2idx[feature] = idx
+            self.idx2feature.append(feature)
+        return idx
+
+    def get(self, feature, default=-1):
+        if self.n_buckets:
+            return zlib.crc32(feature.encode('utf-8')) % self.n_buckets
+        return self.feature2idx.get(feature, default)
+
+    def encode(self, features):
+        """feature 리스트를 id 배열로 변환. vocabulary에 없는 feature는 제외"""
+        ids = [self.get(feature) for feature in features]
+        return np.array([idx for idx in ids if idx >= 0], dtype=np.int32)
+
+    def encode_sentence(self, sentence_):
+        return [self.encode(features) for features in sentence_]
+
+class CountMinSketch:
+    """고정된 메모리로 feature 등장 횟수를 근사하는 카운터
+
+    해시 충돌로 실제보다 크게 셀 수는 있지만 작게 세지는 않는다.
+    같은 프로세스 안에서만 유효하다 (str의 hash를 이용).
+    """
+    def __init__(self, width=2**22, depth=4, seed=0):
+        # multiply-shift hashing을 위해 width를 2의 거듭제곱으로 맞춤
+        self.bits = max(1, (width - 1).bit_length())
+        self.width = 1 << self.bits
+        rng = np.random.RandomState(seed)
+        self._coefs = rng.randint(1, 2**63, size=depth, dtype=np.uint64) | np.uint64(1)
+        self.table = np.zeros((depth, self.width), dtype=np.uint32)
+
+    def _indices(self, features):
+        keys = np.fromiter(
+            map(hash, features), dtype=np.int64, count=len(features)).view(np.uint64)
+        shift = np.uint64(64 - self.bits)
+        return [((keys * coef) >> shift).astype(np.intp) for coef in self._coefs]
+
+    def update(self, features, counts):
+        """feature별 등장 횟수를 더함. features는 서로 달라야 함"""
+        counts = np.asarray(counts, dtype=np.float64)
+        for row, idx in zip(self.table, self._indices(features)):
+            row += np.bincount(idx, weights=counts, minlength=self.width).astype(np.uint32)
+
+    def estimate(self, features):
+        """feature별 추정 등장 횟수 (실제 횟수 이상)"""
+        return np.min([row[idx] for row, idx in zip(self.table, self._indices(features))], axis=0)
+
+# fork로 생성된 worker가 상속받는 (sentence_to_xy, vocabulary)
+_worker_encoder = None
+
+def _encode_sentences(sentences, sentence_to_xy, encode):
+    ids, token_offsets, sentence_offsets, tags = [], [0], [0], []
+    for sentence in sentences:
+        sentence_, y = sentence_to_xy(sentence)
+        for features in sentence_:
+            xi = encode(features)
+            ids.append(xi)
+            token_offsets.append(token_offsets[-1] + len(xi))
+        tags.extend(y)
+        sentence_offsets.append(len(tags))
+    return {
+        'ids': np.concatenate(ids) if ids else np.zeros(0, dtype=np.int32),
+        'token_offsets': np.array(token_offsets, dtype=np.int64),
+        'sentence_offsets': np.array(sentence_offsets, dtype=np.int64),
+        'tags': np.array(tags, dtype=str),
+    }
+
+def _encode_chunk(sentences):
+    """문장들을 feature id로 변환하여 이어붙인 배열들로 리턴
+
+    ids[token_offsets[j]:token_offsets[j+1]]가 j번째 단어의 feature id이고,
+    sentence_offsets[k]:sentence_offsets[k+1]가 k번째 문장의 단어 범위이다.
+    """
+    sentence_to_xy, vocabulary = _worker_encoder
+    return _encode_sentences(sentences, sentence_to_xy, vocabulary.encode)
+
+def _scan_chunk(sentences):
+    """_encode_chunk와 같으나 chunk 안에서 처음 등장한 순서로 feature id를 부여.
+    chunk의 feature 목록('features')과 feature별 등장 횟수('counts')를 함께 리턴"""
+    sentence_to_xy, _ = _worker_encoder
+    feature2idx = {}
+    add = feature2idx.setdefault
+    chunk = _encode_sentences(
+        sentences, sentence_to_xy,
+        lambda features: np.array([add(feature, len(feature2idx)) for feature in features],
+                                  dtype=np.int32))
+    chunk['features'] = list(feature2idx)
+    chunk['counts'] = np.bincount(chunk['ids'], minlength=len(feature2idx))
+    return chunk
+
+def _remap_chunk(chunk, mapping):
+    """chunk의 feature id를 mapping[id]로 바꾼 _encode_chunk 형태. mapping이 -1인 feature는 제외"""
+    ids = mapping[chunk['ids']]
+    keep = ids >= 0
+    kept = np.concatenate([[0], np.cumsum(keep)])
+    return {
+        'ids': ids[keep].astype(np.int32),
+        'token_offsets': kept[chunk['token_offsets']],
+        'sentence_offsets': chunk['sentence_offsets'],
+        'tags': chunk['tags'],
+    }
+
+def _decode_chunk(chunk):
+    """_encode_chunk의 결과에서 문장별 (단어별 feature id 배열 리스트, 품사열)을 yield"""
+    ids, token_offsets = chunk['ids'], chunk['token_offsets']
+    tags = chunk['tags'].tolist()
+    sentence_offsets = chunk['sentence_offsets'].tolist()
+    for begin, end in zip(sentence_offsets, sentence_offsets[1:]):
+        x = [ids[token_offsets[j]:token_offsets[j+1]] for j in range(begin, end)]
+        yield x, tags[begin:end]
+
+def encode_corpus(sentences, sentence_to_xy, vocabulary, workers=1, chunk_size=10000):
+    """코퍼스를 chunk_size개의 문장씩 process pool에서 feature id로 변환하여
+    _encode_chunk의 결과를 순서대로 yield. 처리 중인 chunk는 최대 workers * 2개"""
+    return _map_chunks(_encode_chunk, sentences, sentence_to_xy, vocabulary, workers, chunk_size)
+
+def scan_corpus(sentences, sentence_to_xy, workers=1, chunk_size=10000):
+    """encode_corpus와 같으나 vocabulary 없이 변환하여 _scan_chunk의 결과를 yield"""
+    return _map_chunks(_scan_chunk, sentences, sentence_to_xy, None, workers, chunk_size)
+
+def _map_chunks(function, sentences, sentence_to_xy, vocabulary, workers, chunk_size):
+    global _worker_encoder
+
+    _worker_encoder = (sentence_to_xy, vocabulary)
+    iterator = iter(sentences)
+    chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+    try:
+        if workers <= 1:
+            yield from map(function, chunks)
+            return
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(function, (chunk,)))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+    finally:
+        _worker_encoder = None
+
+def corpus_fingerprint(sentences):
+    """코퍼스 파일(HMM/utils.py의 Corpus)의 경로, 크기, 수정 시각.
+    HMM/shards.py의 CorpusShards는 변환할 때 기록한 원본 파일 정보.
+    파일 정보가 없는 리스트 등은 내용의 해시"""
+    fingerprint = getattr(sentences, 'fingerprint', None)
+    if fingerprint:
+        return fingerprint
+    txt_path = getattr(sentences, 'txt_path', None)
+    if txt_path:
+        stat = os.stat(txt_path)
+        return '%s:%d:%d:%d' % (os.path.abspath(txt_path), stat.st_size,
+                                stat.st_mtime_ns, getattr(sentences, 'num_lines', 0))
+    digest = hashlib.sha1()
+    for sentence in sentences:
+        digest.update(repr(sentence).encode('utf-8'))
+    return digest.hexdigest()
+
+class FeatureCache:
+    """feature id로 변환한 코퍼스를 shard 단위 파일로 저장하는 디스크 cache
+
+    cache_dir/key/ 아래에 vocabulary.json과 shard-00000.npz, ...를 저장한다.
+    vocabulary.json은 모든 shard를 쓴 뒤 마지막에 저장되므로, 이 파일이
+    있으면 cache가 완성된 것이다.
+    """
+    def __init__(self, cache_dir, key):
+        self.path = os.path.join(cache_dir, key)
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, 'vocabulary.json'))
+
+    def write(self, chunks, vocabulary, counts):
+        tmp_path = self.path + '.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        num_shards = 0
+        for chunk in chunks:
+            np.savez(os.path.join(tmp_path, 'shard-%05d.npz' % num_shards), **chunk)
+            num_shards += 1
+
+        meta = {
+            'idx2feature': vocabulary.idx2feature,
+            'n_buckets': vocabulary.n_buckets,
+            'feature_counts': None if counts is None else counts.tolist(),
+            'num_shards': num_shards,
+        }
+        with open(os.path.join(tmp_path, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.rename(tmp_path, self.path)
+
+    def load_vocabulary(self):
+        with open(os.path.join(self.path, 'vocabulary.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        counts = meta['feature_counts']
+        if counts is not None:
+            counts = np.array(counts, dtype=np.int64)
+        return FeatureVocabulary(meta['idx2feature'], meta['n_buckets']), counts
+
+    def __iter__(self):
+        """문장별 (단어별 feature id 배열 리스트, 품사열)"""
+        with open(os.path.join(self.path, 'vocabulary.json'), encoding='utf-8') as f:
+            num_shards = json.load(f)['num_shards']
+        for i in range(num_shards):
+            with np.load(os.path.join(self.path, 'shard-%05d.npz' % i)) as chunk:
+                yield from _decode_chunk(dict(chunk))
+
+class _ChunkSpool:
+    """vocabulary를 만드는 동안 _scan_chunk의 결과를 저장해 두는 디렉토리
+
+    chunk별로 feature 목록(json)과 나머지 배열(npz)을 저장하므로 코퍼스
+    크기와 관계없이 메모리에는 chunk 하나만 올라간다.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.num_chunks = 0
+
+    def _prefix(self, i):
+        return os.path.join(self.path, 'chunk-%05d' % i)
+
+    def _features(self, i):
+        with open(self._prefix(i) + '.json', encoding='utf-8') as f:
+            return json.load(f)
+
+    def append(self, chunk):
+        prefix = self._prefix(self.num_chunks)
+        # json.dump는 파일에 조금씩 쓰며 python 구현의 encoder를 사용하므로 dumps로 한 번에 씀
+        with open(prefix + '.json', 'w', encoding='utf-8') as f:
+            f.write(json.dumps(chunk.pop('features'), ensure_ascii=False))
+        np.savez(prefix + '.npz', **chunk)
+        self.num_chunks += 1
+
+    def counts(self):
+        """chunk별 (feature 리스트, 등장 횟수 리스트)"""
+        for i in range(self.num_chunks):
+            with np.load(self._prefix(i) + '.npz') as chunk:
+                counts = chunk['counts'].tolist()
+            yield self._features(i), counts
+
+    def remap(self, vocabulary):
+        """vocabulary의 id로 바꾼 _encode_chunk 형태의 chunk들"""
+        get = vocabulary.feature2idx.get
+        for i in range(self.num_chunks):
+            mapping = np.array([get(feature, -1) for feature in self._features(i)], dtype=np.int64)
+            with np.load(self._prefix(i) + '.npz') as chunk:
+                chunk = dict(chunk)
+            yield _remap_chunk(chunk, mapping)
+
 class Trainer:
+    """CRF 학습기
+
+    train은 코퍼스를 한 번만 순회하므로 sentences는 리스트, HMM/utils.py의
+    Corpus, read_corpus(lazy=True)의 generator 모두 가능하다. Corpus나
+    generator를 이용하면 코퍼스 전체를 메모리에 올리지 않고 학습할 수 있다.
+
+    cache_dir이 주어지면 feature id로 변환한 코퍼스를 저장해 두고, 같은
+    transformer class, 코퍼스 파일, min_count, n_buckets로 다시 학습할 때
+    feature scan과 변환을 생략한다. transformer 객체의 설정 값은 key에
+    포함되지 않으므로 설정을 바꾼 경우 다른 cache_dir을 사용한다. cache의
+    key를 만들 때 파일 정보가 없는 코퍼스는 내용을 순회하므로, cache_dir을
+    사용할 때는 generator 대신 리스트나 Corpus를 넘긴다.
+    """
     def __init__(self, corpus=None, sentence_to_xy=None, min_count=3,
                  l2_cost=1.0, l1_cost=1.0, max_iter=300, verbose=True,
-                 scan_batch_size=200000):
+                 scan_batch_size=10000, sketch_width=2**22, sketch_depth=4,
+                 n_buckets=0, cache_dir=None, workers=1,
+                 model_path='temporal_model'):
         self.sentence_to_xy = sentence_to_xy
         self.min_count = min_count
         self.l2_cost = l2_cost
         self.l1_cost = l1_cost
         self.max_iter = max_iter
         self.verbose = verbose
+        # feature 변환과 등장 횟수를 세는 단위 (문장 수). worker에 보내는 chunk의 크기
         self.scan_batch_size = scan_batch_size
+        # vocabulary를 만들 때 사용하는 count-min sketch의 크기 (width * depth * 4 bytes).
+        # 0이면 sketch 없이 모든 feature의 등장 횟수를 메모리에서 센다.
+        self.sketch_width = sketch_width
+        self.sketch_depth = sketch_depth
+        # 0보다 크면 feature vocabulary 대신 n_buckets개의 hashing trick 이용
+        self.n_buckets = n_buckets
+        # feature 변환 cache와 변환에 사용할 프로세스 수
+        self.cache_dir = cache_dir
+        self.workers = workers
+        # pycrfsuite가 학습 결과를 저장하는 파일
+        self.model_path = model_path
 
         if corpus is not None:
             self.train(corpus)
 
-    def scan_features(self, sentences, sentence_to_xy, min_count=2):
-        """최소 등장 횟수 이하의 feature는 cut하는 메서드"""
-        def trim(count, min_count):
-            counter = {
-                feature:count for feature, count in counter.items()
-                # 최소 등장 횟수 넘거나 단어 자체만 기억
-                if (count >= min_count) or (feature[:4] == 'x[0]' and not ', ' in feature)
-            }
-            return counter
-
-        counter = {}
-
-        for i, sentence in enumerate(sentences):
-            # 문장을 feature로 변환
-            sentence_, _ = sentence_to_xy(sentence)
-            for features in sentence_:
-                for feature in features:
-                    counter[feature] = counter.get(feature, 0) + 1
-
+    def scan_features(self, sentences, sentence_to_xy, min_count=2, scan_batch_size=None):
+        """최소 등장 횟수 미만의 feature는 cut하는 메서드
 
-        # 등장수 적은 feature를 삭제
-        counter = trim(counter, min_count)
-        return counter
+        scan_batch_size개의 문장 (None이면 self.scan_batch_size) 단위로 feature를
+        세며 count_features로 합산한다. sketch를 사용하면 (sketch_width > 0)
+        코퍼스를 두 번 순회한다. train은 변환한 chunk를 저장해 두고 같은
+        방식으로 세므로 코퍼스를 한 번만 변환한다.
+        """
+        scan_batch_size = scan_batch_size or self.scan_batch_size
+        return count_features(
+            lambda: ((list(batch), list(batch.values()))
+                     for batch in _count_batches(sentences, sentence_to_xy, scan_batch_size)),
+            min_count, self.sketch_width, self.sketch_depth)
 
     def train(self, sentences):
-        features = self.scan_features(
-            sentences, self.sentence_to_xy,
-            self.min_count, self.scan_batch_size)
-
-        # feature encoder
-        self._features = {
-            # feature의 idx와 count 기록
-            feature:Feature(idx, count) for idx, (feature, count) in
-            enumerate(sorted(features.items(), key=lambda x:-x[1]
-                             ))
-        }
-
-        # feature id decoder
-        self._idx2feature = [
-            feature for feature in sorted(
-                self._features, key=lambda x:self._features[x].idx)]
-
-        self._train_pycrfsuite(sentences)
+        if self.cache_dir:
+            if iter(sentences) is sentences:
+                raise ValueError('sentences must be re-iterable (list or Corpus) when cache_dir is set')
+            cache = FeatureCache(self.cache_dir, self._cache_key(sentences))
+            if not cache.exists():
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with tempfile.TemporaryDirectory(dir=self.cache_dir) as spool:
+                    chunks = self._encode(sentences, spool)
+                    cache.write(chunks, self.vocabulary, self._feature_counts)
+            else:
+                self.vocabulary, self._feature_counts = cache.load_vocabulary()
+            self._train_pycrfsuite(cache)
+        else:
+            with tempfile.TemporaryDirectory() as spool:
+                chunks = self._encode(sentences, spool)
+                self._train_pycrfsuite(xy for chunk in chunks for xy in _decode_chunk(chunk))
         self._parse_coefficients()
 
-    def _train_pycrfsuite(self, sentences):
+    def _cache_key(self, sentences):
+        # bound method의 __qualname__은 정의한 class (AbstractFeatureTransformer 등)이므로
+        # transformer 객체의 class로 구분. 일반 함수는 함수 자체
+        transformer = getattr(self.sentence_to_xy, '__self__', self.sentence_to_xy)
+        if not isinstance(transformer, types.FunctionType):
+            transformer = type(transformer)
+        key = '\n'.join([
+            '%s.%s' % (transformer.__module__, transformer.__qualname__),
+            corpus_fingerprint(sentences),
+            'min_count=%d' % self.min_count,
+            'n_buckets=%d' % self.n_buckets,
+        ])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _encode(self, sentences, spool_path):
+        """vocabulary를 만들고 feature id로 변환한 chunk들의 iterator를 리턴
+
+        n_buckets가 0이면 코퍼스를 process pool에서 한 번만 변환한다. worker는
+        chunk 안의 id로 변환한 chunk와 feature별 등장 횟수를 리턴하고, 이를
+        spool_path에 저장한다. 저장한 등장 횟수를 count_features로 합산하여
+        vocabulary를 만든 뒤, 저장한 chunk를 하나씩 읽어 id를 바꾼다.
+        """
+        if self.n_buckets:
+            # 등장 횟수가 적은 feature는 pycrfsuite의 feature.minfreq로 제거
+            self.vocabulary = FeatureVocabulary(n_buckets=self.n_buckets)
+            self._feature_counts = None
+            return encode_corpus(sentences, self.sentence_to_xy, self.vocabulary,
+                                 self.workers, self.scan_batch_size)
+
+        spool = _ChunkSpool(spool_path)
+        for chunk in scan_corpus(sentences, self.sentence_to_xy, self.workers, self.scan_batch_size):
+            spool.append(chunk)
+
+        # feature의 id는 등장 횟수 내림차순 (같으면 코퍼스에서 처음 등장한 순서)
+        features = count_features(
+            spool.counts, self.min_count, self.sketch_width, self.sketch_depth)
+        features = sorted(features.items(), key=lambda x:-x[1])
+        self.vocabulary = FeatureVocabulary([feature for feature, _ in features])
+        self._feature_counts = np.array([count for _, count in features], dtype=np.int64)
+        return spool.remap(self.vocabulary)
+
+    def _train_pycrfsuite(self, encoded):
+        """encoded : 문장별 (단어별 feature id 배열 리스트, 품사열)"""
+        # pycrfsuite는 학습할 때만 필요하므로 CRF 모듈을 불러올 때 import하지 않음
+        import pycrfsuite
+
         trainer = pycrfsuite.Trainer(verbose=self.verbose)
-        for i, sentence in enumerate(sentences):
-            # transform sentence to features
-            sentence_, _ = self.sentence_to_xy(sentence)
-            # use only conformed feature
-            x = [[xij for xij in xi if xij in self._features] for xi in x]
-            trainer.append(x, y)
+        for x, y in encoded:
+            trainer.append([[str(idx) for idx in xi.tolist()] for xi in x], y)
 
         # set pycrfsuite parameters
         params = {
@@ -145,25 +539,28 @@ class Trainer:
 
         # do train
         trainer.set_params(params)
-        trainer.train('temporal_model')
+        trainer.train(self.model_path)
 
     def _parse_coefficients(self):
+        import pycrfsuite
+
         # load pycrfsuite trained model
         tagger = pycrfsuite.Tagger()
-        tagger.open('temporal_model')
+        tagger.open(self.model_path)
 
-        # state feature coefficient
+        # state feature coefficient: (feature id, tag)
         debugger = tagger.info()
-        self.state_features = debugger.state_features
+        self.state_features = {
+            (int(idx), tag):coef for (idx, tag), coef in debugger.state_features.items()}
 
         # transition coefficient
-        self.transitions = debugger.trasitions
+        self.transitions = debugger.transitions
 
     def _save_as_json(self, json_path):
         # concatenate key that formed as tuple of str
         state_features_json = {
-            ' -> '.join(state_feature):coef
-            for state_feature, coef in self.state_fatures.items()
+            '%d -> %s' % state_feature:coef
+            for state_feature, coef in self.state_features.items()
         }
 
         # concatenate key that formed as tuple of str
@@ -176,15 +573,23 @@ class Trainer:
         params = {
             'state_features': state_features_json,
             'transitions': transitions_json,
-            'idx2feature': self._idx2feature,
-            'features': self._features
+            'idx2feature': self.vocabulary.idx2feature,
+            'n_buckets': self.vocabulary.n_buckets,
         }
+        if self._feature_counts is not None:
+            params['feature_counts'] = self._feature_counts.tolist()
 
         # save
         with open(json_path, 'w', encoding='utf-8') as f:
             json.dump(params, f, ensure_ascii=False, indent=2)
 
 class TrainedCRFTagger:
+    """학습된 CRF 모델로 단어열의 품사를 판별
+
+    feature는 앞 단어의 품사(y[-1])와 무관한 feature와, y[-1]을 포함하는
+    feature로 나뉜다. 전자는 단어별 품사 점수 벡터로, 후자는 단어별
+    (앞 품사 x 품사) 점수 행렬로 합산한 뒤 viterbi로 최적 품사열을 찾는다.
+    """
     def __init__(self, model_path=None, coefficients=None,
                  feature_transformer=None, verbose=False):
 
@@ -203,26 +608,148 @@ class TrainedCRFTagger:
             for trans, coef in model['transitions'].items()
         }
 
-        # parse state features
-        self._state_features = {
-            tuple(feature.split(marker)): coef
-            for feature, coef in model['state_feature'].items()
-        }
+        # parse state features: (feature id, tag)
+        self._state_features = {}
+        for feature, coef in model['state_features'].items():
+            idx, tag = feature.split(marker)
+            self._state_features[(int(idx), tag)] = coef
+
+        # feature id encoder
+        self.vocabulary = FeatureVocabulary(
+            model['idx2feature'], model.get('n_buckets', 0))
+
+        self._build_matrices()
+
+    def _build_matrices(self):
+        # 품사 id
+        tags = {tag for tag, _ in self._transitions} | {tag for _, tag in self._transitions}
+        tags |= {tag for _, tag in self._state_features}
+        self._id2tag = sorted(tags)
+        self._tag2id = {tag:i for i, tag in enumerate(self._id2tag)}
+        n_tags = len(self._id2tag)
+
+        # (앞 품사, 품사) transition 행렬
+        self._transition_matrix = np.zeros((n_tags, n_tags))
+        for (tag0, tag1), coef in self._transitions.items():
+            self._transition_matrix[self._tag2id[tag0], self._tag2id[tag1]] = coef
+
+        # feature id별 (품사 id, 가중치)를 CSR 형태로 저장
+        n_features = len(self.vocabulary)
+        items = sorted((idx, self._tag2id[tag], coef)
+                       for (idx, tag), coef in self._state_features.items())
+        feature_ids = np.array([idx for idx, _, _ in items], dtype=np.int64)
+        self._feature_tags = np.array([tag for _, tag, _ in items], dtype=np.int64)
+        self._feature_coefs = np.array([coef for _, _, coef in items], dtype=np.float64)
+        self._feature_indptr = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(np.bincount(feature_ids, minlength=n_features),
+                  out=self._feature_indptr[1:])
+
+    def _feature_scores(self, rows, ids, n_rows):
+        """rows[k]번째 행에 ids[k] feature의 품사별 가중치를 더한 (n_rows, 품사 수) 행렬"""
+        n_tags = len(self._id2tag)
+        begin = self._feature_indptr[ids]
+        lengths = self._feature_indptr[ids + 1] - begin
+        # 각 feature의 CSR 구간을 펼침
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(begin, lengths) + offsets
+        cells = np.repeat(rows, lengths) * n_tags + self._feature_tags[positions]
+        scores = np.bincount(cells, weights=self._feature_coefs[positions],
+                             minlength=n_rows * n_tags)
+        return scores.reshape(n_rows, n_tags)
+
+    def _potentials(self, sentences):
+        """문장별 (단어별 품사 점수, 단어별 (앞 품사, 품사) 점수)"""
+        n_tags = len(self._id2tag)
+
+        # (행 번호, feature id) 목록. 관측 feature는 단어마다 한 행,
+        # y[-1] feature는 (단어, 앞 품사)마다 한 행을 이용
+        obs_rows, obs_ids, cond_rows, cond_ids = [], [], [], []
+        get = self.vocabulary.get
+        n_tokens = 0
+        for words in sentences:
+            words_ = tuple((bos, *words, eos))
+            tags_ = tuple((bos, *[unknown_tag] * len(words), eos))
+            for i, features in enumerate(self.feature_transformer.potential_function(words_, tags_)):
+                row = n_tokens + i
+                conditioned = []
+                for feature in features:
+                    if unknown_tag in feature:
+                        conditioned.append(feature)
+                        continue
+                    idx = get(feature)
+                    if idx >= 0:
+                        obs_rows.append(row)
+                        obs_ids.append(idx)
+                for tag, tag_id in self._tag2id.items():
+                    for feature in conditioned:
+                        idx = get(feature.replace(unknown_tag, tag))
+                        if idx >= 0:
+                            cond_rows.append(row * n_tags + tag_id)
+                            cond_ids.append(idx)
+            n_tokens += len(words)
+
+        observation = self._feature_scores(
+            np.array(obs_rows, dtype=np.int64), np.array(obs_ids, dtype=np.int64), n_tokens)
+        conditional = self._feature_scores(
+            np.array(cond_rows, dtype=np.int64), np.array(cond_ids, dtype=np.int64),
+            n_tokens * n_tags).reshape(n_tokens, n_tags, n_tags)
+
+        offset = 0
+        for words in sentences:
+            yield observation[offset:offset + len(words)], conditional[offset:offset + len(words)]
+            offset += len(words)
+
+    def _viterbi(self, observation, conditional):
+        n = len(observation)
+        if n == 0:
+            return []
+
+        # 첫 단어의 앞 품사는 BOS로 정해져 있으므로 y[-1] feature가 관측 feature에 포함됨
+        delta = observation[0]
+        backpointers = []
+        for i in range(1, n):
+            candidates = delta[:, None] + self._transition_matrix + conditional[i]
+            best = candidates.argmax(axis=0)
+            backpointers.append(best)
+            delta = candidates[best, np.arange(len(best))] + observation[i]
+
+        path = [int(delta.argmax())]
+        for best in reversed(backpointers):
+            path.append(int(best[path[-1]]))
+        return [self._id2tag[tag_id] for tag_id in reversed(path)]
+
+    def tag(self, words):
+        """단어열의 품사 판별
+
+        input:
+            words (List(str)) : [word, word, ...]
+        output:
+            List(tuple) : [(word, tag), (word, tag), ...]
+        """
+        return self.tag_batch([words])[0]
+
+    def tag_batch(self, sentences):
+        """여러 단어열의 feature 가중치를 한 번에 합산한 뒤 각각 viterbi로 품사 판별"""
+        sentences = [list(words) for words in sentences]
+        return [
+            list(zip(words, self._viterbi(observation, conditional)))
+            for words, (observation, conditional) in zip(sentences, self._potentials(sentences))
+        ]
 
     def score(self, sentence):
 
         # feature transform
-        sentence_, tags = self.feature_transformer(sentence)
+        sentence_, tags = self.feature_transformer.sentence_to_ids(sentence, self.vocabulary)
         score = 0
 
         # transition weight
         for s0, s1 in zip(tags, tags[1:]):
-            score += self.transitions.get((s0, s1), 0)
+            score += self._transitions.get((s0, s1), 0)
 
         # state feature weight
         for features, tag in zip(sentence_, tags):
-            for feature in features:
-                coef = self.state_features.get((feature, tag), 0)
+            for feature in features.tolist():
+                coef = self._state_features.get((feature, tag), 0)
                 score += coef
 
         return score
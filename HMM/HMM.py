@@ -1,17 +1,56 @@
+import re
+import sys
 import json
 import argparse
+from bisect import bisect_right
 
-from soynlp.lemmatizer import lemma_candidate
+import numpy as np
+
+import parallel
+from cache import LRUCache
+from dictionary import WordIndex, read_user_dictionary
+from instrument import TaggerStats
+from model import BinaryModel, CompactModel
 
 # Argparse setting
 parser = argparse.ArgumentParser(description="세종 말뭉치 이용 품사 분석 입력")
 
 # argument
 parser.add_argument('--json_path', type=str, default='data/trained_corpus_type1.json')
-parser.add_argument('--text', type=str, required=True)
+# model.py로 변환한 바이너리 모델. 지정하면 json_path 대신 사용
+parser.add_argument('--model_path', type=str, default=None)
+# 모델을 정렬된 단어 리스트 + float32 점수 배열 형태로 메모리에 올려 사용
+parser.add_argument('--compact', action='store_true')
+inputs = parser.add_mutually_exclusive_group(required=True)
+inputs.add_argument('--text', type=str)
+# 한 줄에 한 문장씩 들어있는 파일. '-'이면 표준 입력에서 읽는다.
+inputs.add_argument('--input_path', type=str)
+parser.add_argument('--output_path', type=str, default='-')
+parser.add_argument('--workers', type=int, default=0)
+parser.add_argument('--engine', type=str, default='viterbi', choices=['viterbi', 'ford'])
+# 경로 탐색에서 글자 위치별로 유지할 노드 수 (근사 탐색). 0이면 lattice 전체를 탐색.
+# lattice 생성 후 경로 탐색에만 적용되므로 분석 시간은 줄지 않는다
+parser.add_argument('--beam_width', type=int, default=0)
+# --text의 분석 결과를 점수가 높은 순으로 최대 nbest개 출력
+parser.add_argument('--nbest', type=int, default=1)
+# 입력 전체를 하나의 문서로 보고 문장 / 어절 window 단위로 나누어 분석.
+# 결과는 한 줄에 (형태소, 품사, 시작, 끝) 하나씩 출력
+parser.add_argument('--document', action='store_true')
+parser.add_argument('--max_eojeols', type=int, default=64)
+# 사용자 사전 파일들 (tsv 또는 .npz). 뒤에 지정한 사전이 우선
+parser.add_argument('--user_dict', type=str, nargs='*', default=[])
 
-def load_from_json(json_path):
-    """훈련된 json 데이터 불러오기"""
+# soynlp는 import할 때 sklearn 등을 함께 불러와 오래 걸리므로 처음 용언을 분리할 때 import
+lemma_candidate = None
+
+def _import_lemma_candidate():
+    global lemma_candidate
+    if lemma_candidate is None:
+        from soynlp.lemmatizer import lemma_candidate
+    return lemma_candidate
+
+def _read_json_model(json_path):
+    """json 모델의 (emission, transition, begin, 모델 통계). 통계가 없는 모델이면 None"""
     with open(json_path, 'r') as f:
         trained = json.load(f)
     emission = trained['emission']
@@ -19,19 +58,63 @@ def load_from_json(json_path):
     begin = trained['begin']
 
     transition = {tuple(k.split("_")):v for k, v in transition.items()}
-    return emission, transition, begin
+    return emission, transition, begin, trained.get('stats')
+
+def load_from_json(json_path):
+    """훈련된 json 데이터 불러오기"""
+    return _read_json_model(json_path)[:3]
+
+def load_from_binary(model_path):
+    """model.py로 변환한 바이너리 모델을 mmap으로 불러오기"""
+    return BinaryModel(model_path)
+
+def load_compact(path, score_dtype=np.float32):
+    """json 모델 또는 바이너리 모델을 CompactModel로 불러오기"""
+    if path.endswith('.json'):
+        return CompactModel.from_tables(*load_from_json(path), score_dtype=score_dtype)
+    return CompactModel.from_binary(path, score_dtype=score_dtype)
+
+# 문장 끝 문장부호. 뒤에 닫는 따옴표 / 괄호가 올 수 있음
+_sentence_end = re.compile(r'[.!?。？！…]+[\'"’”)\]」』]*$')
+
+def split_document(text, max_eojeols=64):
+    """문서를 문장 끝 문장부호, 줄바꿈, 최대 어절 수 기준으로 나눔
+
+    리턴값은 (어절들의 원문 (시작, 끝) 위치 리스트, chunk별 (첫 어절, 마지막 어절 + 1) 리스트)
+    """
+    eojeols = []
+    chunks = []
+    first = 0
+    for match in re.finditer(r'\S+', text):
+        i = len(eojeols)
+        # 줄바꿈을 사이에 두거나 window가 가득 찬 경우 새 chunk 시작
+        if i > first and ('\n' in text[eojeols[-1][1]:match.start()] or
+                          i - first >= max_eojeols):
+            chunks.append((first, i))
+            first = i
+        eojeols.append(match.span())
+        if _sentence_end.search(match.group()):
+            chunks.append((first, i + 1))
+            first = i + 1
+    if first < len(eojeols):
+        chunks.append((first, len(eojeols)))
+    return eojeols, chunks
 
 def ford_list(E, V, S, T):
-    """포드 알고리즘 구현 - log를 취한 확률이므로 longest path 찾도록 구현"""
+    """포드 알고리즘 구현 - log를 취한 확률이므로 longest path 찾도록 구현
+
+    노드는 V의 index이며, 리턴하는 경로는 V의 노드로 이루어진다.
+    """
 
     ## Initialize ##
     # (max weight + 1) * num of nodes
     inf = (min((weight for from_, to_, weight in E)) - 1) * len(V)
 
     # distance
-    d = {node:0 if node == S else inf for node in V}
+    d = [inf] * len(V)
+    d[S] = 0
     # previous node
-    prev = {node:None for node in V}
+    prev = [None] * len(V)
 
     ## Iteration ##
     # preventing infinite loop
@@ -54,47 +137,461 @@ def ford_list(E, V, S, T):
 
     # Finding path
     prev_ = prev[T]
-    if prev_ == S:
-        return {'paths':[[prev_, S][::-1]], 'cost':d[T]}
-
     path = [T]
     while prev_ != S:
         path.append(prev_)
         prev_ = prev[prev_]
     path.append(S)
 
-    return path[::-1], d[T]
+    return [V[node] for node in reversed(path)], d[T]
+
+def viterbi_dag(E, V, S, T, beam_width=0):
+    """DAG 위의 viterbi 알고리즘 - 간선을 한 번만 순회하여 longest path를 찾음
+
+    노드는 V의 index이며 V[i]는 (단어, 품사, 품사, 시작, 끝) 형태이다.
+    E는 시작 노드의 글자 위치 순으로 정렬되어 있어야 한다 (_add_weight의 결과).
+    이 경우 간선 (u, v)를 처리하는 시점에 d[u]는 이미 확정되어 있으므로
+    ford_list와 같은 경로를 O(|E|)에 찾는다.
+
+    beam_width가 0보다 크면 같은 글자 위치에서 시작하는 노드 중 점수 상위
+    beam_width개에서만 경로를 확장한다. 리턴값은 (V의 노드로 이루어진 경로, 점수)
+    """
+
+    # distance / previous node. 도달하지 않은 노드는 None
+    d = [None] * len(V)
+    prev = [None] * len(V)
+    d[S] = 0
+    if beam_width:
+        begin = [node[3] for node in V]
+        # 시작 위치별 도달한 노드
+        by_begin = {}
+        pruned = set(_prune_first(E, S, begin, beam_width))
+        current = None
+
+    for u, v, Wuv in E:
+        if beam_width:
+            if begin[u] != current:
+                current = begin[u]
+                pruned.update(_prune(by_begin.pop(current, []), beam_width, d.__getitem__))
+            # beam 밖의 노드
+            if u in pruned:
+                continue
+        d_u = d[u]
+        # 시작점에서 도달할 수 없는 노드
+        if d_u is None:
+            continue
+        d_new = d_u + Wuv
+        d_v = d[v]
+        if d_v is None:
+            d[v] = d_new
+            prev[v] = u
+            if beam_width:
+                by_begin.setdefault(begin[v], []).append(v)
+        elif d_new > d_v:
+            d[v] = d_new
+            prev[v] = u
+
+    if d[T] is None:
+        raise ValueError('No path from %s to %s' % (V[S][0], V[T][0]))
+
+    # Finding path
+    path = [T]
+    while path[-1] != S:
+        path.append(prev[path[-1]])
+
+    return [V[node] for node in reversed(path)], d[T]
+
+def _prune(reached, beam_width, score):
+    """같은 위치에서 시작하는 노드 중 점수 상위 beam_width개 밖의 노드"""
+    if len(reached) <= beam_width:
+        return []
+    return sorted(reached, key=score, reverse=True)[beam_width:]
+
+def _prune_first(E, S, begin, beam_width):
+    """위치 0에서 시작하는 노드 중 beam 밖의 노드
+
+    BOS도 위치 0에서 시작하므로 간선 순회 중에는 위치 0의 노드들이 모두
+    도달한 시점을 알 수 없다. 이 노드들은 BOS에서만 도달하므로 BOS에서
+    나가는 간선의 점수로 미리 beam을 적용한다.
+    """
+    first = {}
+    for u, v, Wuv in E:
+        if begin[u]:
+            break
+        if u == S:
+            first[v] = Wuv
+    return _prune(list(first), beam_width, first.__getitem__)
+
+def nbest_dag(E, V, S, T, k=1, beam_width=0):
+    """DAG 위에서 점수가 높은 순으로 최대 k개의 경로를 찾음
+
+    viterbi_dag와 같이 정렬된 E를 한 번 순회하며, 노드마다 상위 k개의
+    (점수, 이전 노드, 이전 노드에서의 순위)를 유지한다. 점수가 같으면 먼저
+    도달한 경로가 앞서므로 k=1이면 viterbi_dag와 같은 경로를 찾는다.
+
+    beam_width가 0보다 크면 같은 글자 위치에서 시작하는 노드 중 최고 점수
+    상위 beam_width개에서만 경로를 확장한다. 노드는 viterbi_dag와 같이
+    V의 index이다. 리턴값은 [(path, score), ...]
+    """
+
+    # 노드별 [(점수, 이전 노드, 이전 노드의 순위)], 점수 내림차순
+    best = [None] * len(V)
+    best[S] = [(0, None, 0)]
+    # 정렬 키 (점수의 음수)
+    keys = [None] * len(V)
+    keys[S] = [0]
+    if beam_width:
+        begin = [node[3] for node in V]
+        # 시작 위치별 도달한 노드
+        by_begin = {}
+        pruned = set(_prune_first(E, S, begin, beam_width))
+        current = None
+
+    for u, v, Wuv in E:
+        if beam_width:
+            if begin[u] != current:
+                # 새 시작 위치: 이 위치에서 시작하는 노드들의 점수는 확정됨
+                current = begin[u]
+                pruned.update(_prune(by_begin.pop(current, []), beam_width,
+                                     lambda node: best[node][0][0]))
+            # beam 밖의 노드
+            if u in pruned:
+                continue
+        # 시작점에서 도달할 수 없는 노드
+        if best[u] is None:
+            continue
+        if best[v] is None:
+            best[v] = []
+            keys[v] = []
+            if beam_width:
+                by_begin.setdefault(begin[v], []).append(v)
+        entries, entry_keys = best[v], keys[v]
+        for rank, (d_u, _, _) in enumerate(best[u]):
+            d_new = d_u + Wuv
+            # u의 경로들은 점수 내림차순이므로 이후 경로도 들어갈 수 없음
+            if len(entries) >= k and -d_new >= entry_keys[-1]:
+                break
+            i = bisect_right(entry_keys, -d_new)
+            entries.insert(i, (d_new, u, rank))
+            entry_keys.insert(i, -d_new)
+            if len(entries) > k:
+                entries.pop()
+                entry_keys.pop()
+
+    if best[T] is None:
+        raise ValueError('No path from %s to %s' % (V[S][0], V[T][0]))
+
+    # Finding paths
+    paths = []
+    for rank, (score, _, _) in enumerate(best[T]):
+        node, path = T, [T]
+        while node != S:
+            _, node, rank = best[node][rank]
+            path.append(node)
+        paths.append(([V[node] for node in reversed(path)], score))
+    return paths
+
+# 최적 경로 탐색 엔진
+ENGINES = {
+    'viterbi': viterbi_dag,
+    'ford': ford_list,
+}
+
+class _Analysis:
+    """문장 하나의 분석 단계. tag, tag_nbest, tag_with_offsets가 함께 사용
+
+    lattice 생성 (lookup, link, weight) -> search로 경로 탐색 (path) ->
+    pos로 경로를 형태소 리스트로 변환 (flatten, unknown, postprocessing).
+    tagger가 측정 중이면 단계별 시간과 카운터를 기록하고 finish에서 누적한다.
+    search / pos를 여러 번 호출하면 시간과 unk 수는 더해진다.
+    """
+    def __init__(self, tagger, sentence):
+        self.tagger = tagger
+        self.stats = stats = tagger._stats
+        if stats is None:
+            self.nodes, src, dst, self.bos, self.eos = tagger._generate_link(sentence)
+            self.graph = tagger._add_weight(self.nodes, src, dst)
+            return
+
+        lemma_attempts = tagger._lemma_attempts
+        lemma_hits = tagger._lemma_cache.hits
+        eojeol_hits = tagger._eojeol_cache.hits
+        self.record, t = stats.start()
+        sent = tagger._sentence_lookup(sentence)
+        t = stats.lap(self.record, 'lookup', t)
+        self.record['counters'] = {
+            'sentences': 1,
+            'chars': len(sent),
+            'nodes': sum(len(words) for words in sent),
+        }
+        self.nodes, src, dst, self.bos, self.eos = tagger._generate_link(sentence, sent)
+        t = stats.lap(self.record, 'link', t)
+        self.graph = tagger._add_weight(self.nodes, src, dst)
+        stats.lap(self.record, 'weight', t)
+        self.record['counters'].update({
+            'edges': len(src),
+            'unk': 0,
+            'lemma_attempts': tagger._lemma_attempts - lemma_attempts,
+            'lemma_cache_hits': tagger._lemma_cache.hits - lemma_hits,
+            'eojeol_cache_hits': tagger._eojeol_cache.hits - eojeol_hits,
+        })
+
+    def search(self, find_path):
+        """find_path(graph, nodes, bos, eos)의 결과"""
+        if self.stats is None:
+            return find_path(self.graph, self.nodes, self.bos, self.eos)
+        _, t = self.stats.start()
+        result = find_path(self.graph, self.nodes, self.bos, self.eos)
+        self.stats.lap(self.record, 'path', t)
+        return result
+
+    def pos(self, path):
+        """lattice의 경로 -> [(형태소, 품사), ...]"""
+        tagger = self.tagger
+        if self.stats is None:
+            return tagger._postprocessing(tagger._inference_unknown(tagger._flatten(path)))
+        stats, record = self.stats, self.record
+        _, t = stats.start()
+        pos = tagger._flatten(path)
+        t = stats.lap(record, 'flatten', t)
+        record['counters']['unk'] += sum(1 for _, tag in pos if tag == 'Unk')
+        pos = tagger._inference_unknown(pos)
+        t = stats.lap(record, 'unknown', t)
+        pos = tagger._postprocessing(pos)
+        stats.lap(record, 'postprocessing', t)
+        return pos
+
+    def finish(self):
+        if self.stats is not None:
+            self.stats.finish(self.record)
 
 class HMMTagger:
-    def __init__(self, emission, transition, begin):
+    def __init__(self, emission, transition, begin, engine='viterbi',
+                 lemma_cache_size=100000, eojeol_cache_size=10000,
+                 index=None, stats=None, unknown_suffix_weight=0.0,
+                 instrument=False, stats_callback=None, beam_width=0,
+                 prefilter=True):
         self.emission = emission
         self.transition = transition
         self.begin = begin
-        self._max_word_len = max(
-            len(w) for words in emission.values() for w in words
-        )
-        self._min_emission = min(
-            s for words in emission.values() for s in words.values()) - 0.05
-        self._min_transition = min(transition.values()) - 0.05
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine: %s' % engine)
+        self.engine = engine
+        # 글자 위치별로 유지할 노드 수. 0보다 크면 engine과 관계없이 viterbi의 beam 탐색 사용
+        # (lattice 생성과 점수 계산 후 경로 탐색에만 적용되므로 지연 시간은 줄지 않음)
+        self.beam_width = beam_width
+
+        # 모델 파일에 통계가 저장되어 있으면 테이블을 순회하지 않음
+        if stats is None:
+            stats = self._compute_stats(emission, transition)
+        self._max_word_len = stats['max_word_len']
+        self._min_emission = stats['min_emission'] - 0.05
+        self._min_transition = stats['min_transition'] - 0.05
+        # 단어 index는 처음 사용할 때 생성 (_index)
+        self._word_index = index
+
+        # 사용자 사전 층 (이름 -> {(단어, 품사): 점수}, 나중에 추가한 층이 우선)과
+        # 층이 덮어쓴 (단어, 품사)의 원래 점수 (없던 단어이면 None)
+        self._user_layers = {}
+        self._user_base = {}
+
+        # 용언 분리 결과, 어절별 lattice 캐시
+        self._lemma_cache = LRUCache(lemma_cache_size)
+        self._eojeol_cache = LRUCache(eojeol_cache_size)
+        self._lemma_attempts = 0
+
+        # 단계별 시간/카운터 측정. 사용하지 않으면 None
+        self._stats = None
+        if instrument or stats_callback is not None:
+            self.enable_instrumentation(stats_callback)
+
+        self._build_transition_matrix()
+
+        # 어간/어미 후보가 될 수 없는 분리는 lemma_candidate 호출 전에 제외.
+        # index는 처음 lattice를 만들 때 생성
+        self.prefilter = prefilter
+        self._eomi_index = self._stem_index = None
+
+        # Unk 품사 추론 시 마지막 글자 기반 품사 점수의 가중치. 0이면 사용하지 않음
+        self.unknown_suffix_weight = unknown_suffix_weight
+        if unknown_suffix_weight:
+            self._build_suffix_model()
+
+    @staticmethod
+    def _compute_stats(emission, transition):
+        """단어 최대 길이, 최소 emission / transition 점수. emission은 한 번만 순회"""
+        max_word_len = 0
+        min_emission = float('inf')
+        for words in emission.values():
+            for word, score in words.items():
+                if len(word) > max_word_len:
+                    max_word_len = len(word)
+                if score < min_emission:
+                    min_emission = score
+        return {
+            'max_word_len': max_word_len,
+            'min_emission': min_emission,
+            'min_transition': min(transition.values()),
+        }
+
+    @classmethod
+    def from_json(cls, json_path, **kwargs):
+        """train.py가 저장한 json 모델로부터 tagger 생성. 모델에 저장된 통계가 있으면 사용"""
+        emission, transition, begin, stats = _read_json_model(json_path)
+        kwargs.setdefault('stats', stats)
+        return cls(emission, transition, begin, **kwargs)
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        """BinaryModel / CompactModel로부터 tagger 생성"""
+        return cls(model.emission, model.transition, model.begin,
+                   index=model.index, stats=model.stats, **kwargs)
 
     def tag(self, sentence):
-        # lookup & generate graph
-        links, bos, eos = self._generate_link(sentence)
-        graph = self._add_weight(links)
+        analysis = _Analysis(self, sentence)
+        path, cost = analysis.search(self._find_path)
+        pos = analysis.pos(path)
+        analysis.finish()
+        return pos
+
+    def tag_nbest(self, sentence, k=5):
+        """점수가 높은 순으로 최대 k개의 분석 결과와 그 점수
+
+        lattice의 서로 다른 경로가 같은 분석 결과가 되는 경우
+        (예: 용언 노드와 어간/어미 노드) 점수가 높은 하나만 남긴다.
+        lattice의 경로가 모두 같은 분석 결과가 되는 경우에만 k개보다 적다.
+        리턴값은 [(pos, score), ...]
+        """
+        if k < 1:
+            return []
+        analysis = _Analysis(self, sentence)
+
+        # 중복을 제외하고 k개가 될 때까지 찾는 경로의 수를 두 배씩 늘림
+        n_paths = k
+        while True:
+            paths = analysis.search(
+                lambda *lattice: nbest_dag(*lattice, n_paths, self.beam_width))
+            results = []
+            seen = set()
+            for path, score in paths:
+                pos = analysis.pos(path)
+                key = tuple(pos)
+                if key not in seen:
+                    seen.add(key)
+                    results.append((pos, score))
+                    if len(results) == k:
+                        analysis.finish()
+                        return results
+            # lattice의 모든 경로를 찾은 경우
+            if len(paths) < n_paths:
+                analysis.finish()
+                return results
+            n_paths *= 2
 
-        # find optimal path
-        nodes = {node for edge in graph for node in edge[:2]}
-        path, cost = ford_list(graph, nodes, bos, eos)
-        pos = self._flatten(path)
+    def tag_with_offsets(self, sentence):
+        """tag와 같으나 각 형태소가 나온 원문의 (시작, 끝) 글자 위치를 함께 리턴
 
-        # infering tag of unknown words
-        pos = self._inference_unknown(pos)
+        용언의 어간과 어미처럼 한 노드에서 분리된 형태소는 같은 위치를 갖는다.
+        리턴값은 [(형태소, 품사, 시작, 끝), ...]
+        """
+        analysis = _Analysis(self, sentence)
+        path, cost = analysis.search(self._find_path)
+        pos = analysis.pos(path)
+        analysis.finish()
 
-        # post processing
-        pos = self._postprocessing(pos)
+        # lattice의 위치는 공백을 제외한 글자 기준 (str.split과 같은 isspace 기준)
+        index = [i for i, char in enumerate(sentence) if not char.isspace()]
+        spans = [(b, e) for word, _, _, b, e in path[1:-1] for _ in word.split(' + ')]
+        return [(morph, tag, index[b], index[e-1] + 1)
+                for (morph, tag), (b, e) in zip(pos, spans)]
 
+    def tag_document(self, text, max_eojeols=64, overlap=0, workers=1, chunk_size=16):
+        """긴 문서를 chunk로 나누어 분석하고 원문의 글자 위치와 함께 리턴
+
+        tag는 입력 전체를 하나의 lattice로 만들므로 문서가 길어지면 시간과
+        메모리가 함께 늘어난다. tag_document는 문장 끝 문장부호, 줄바꿈,
+        최대 max_eojeols개의 어절 단위로 문서를 나누어 chunk별로 분석하므로
+        chunk 하나의 lattice 크기가 제한된다. overlap > 0이면 chunk 앞뒤로
+        overlap개의 어절을 붙여 분석한 뒤, chunk 안에서 시작하는 형태소만
+        남긴다. workers가 1보다 크면 chunk들을 process pool에서 분석한다.
+        리턴값은 [(형태소, 품사, 시작, 끝), ...]
+        """
+        eojeols, chunks = split_document(text, max_eojeols)
+        windows = []
+        for first, last in chunks:
+            spans = eojeols[max(0, first - overlap):min(len(eojeols), last + overlap)]
+            windows.append((spans, eojeols[first][0], eojeols[last-1][1]))
+
+        # 어절 사이의 공백 / 줄바꿈은 공백 하나로 바꾸어 분석
+        texts = (' '.join(text[b:e] for b, e in spans) for spans, _, _ in windows)
+        results = parallel.tag_stream(
+            self, texts, workers, chunk_size, method='tag_with_offsets')
+        pos = []
+        for (spans, chunk_b, chunk_e), tagged in zip(windows, results):
+            # 분석한 문자열의 글자 위치 -> 원문의 글자 위치
+            index = []
+            for b, e in spans:
+                index += range(b, e + 1)
+            for morph, tag, begin, end in tagged:
+                begin, end = index[begin], index[end-1] + 1
+                if chunk_b <= begin < chunk_e:
+                    pos.append((morph, tag, begin, end))
         return pos
 
+    @property
+    def _index(self):
+        if self._word_index is None:
+            self._word_index = WordIndex(self.emission)
+        return self._word_index
+
+    def prepare(self):
+        """처음 사용할 때 준비하는 항목 (soynlp, 단어 index, 어간/어미 index)을 미리 준비
+
+        process pool을 fork하기 전에 호출하면 worker마다 따로 준비하지 않고
+        부모 프로세스에서 준비한 것을 공유한다.
+        """
+        _import_lemma_candidate()
+        self._index
+        if self.prefilter and self._eomi_index is None:
+            self._build_lemma_index()
+        return self
+
+    def _find_path(self, graph, nodes, bos, eos):
+        if self.beam_width:
+            return viterbi_dag(graph, nodes, bos, eos, self.beam_width)
+        return ENGINES[self.engine](graph, nodes, bos, eos)
+
+    def enable_instrumentation(self, callback=None):
+        """tag / tag_nbest / tag_with_offsets (tag_document 포함)의 단계별
+        시간/카운터 측정 시작. callback이 주어지면 호출마다 그 호출의 기록을 전달한다."""
+        self._stats = TaggerStats(callback)
+
+    def disable_instrumentation(self):
+        self._stats = None
+
+    def stats(self):
+        """단계별 누적 시간(초)과 카운터, 캐시 통계. 측정 중이 아니면 None
+
+        tag_batch / tag_stream의 worker 프로세스에서 측정한 값은 포함되지 않는다.
+        """
+        if self._stats is None:
+            return None
+        stats = self._stats.snapshot()
+        stats['cache'] = self.cache_info()
+        return stats
+
+    def reset_stats(self):
+        if self._stats is not None:
+            self._stats.reset()
+
+    def tag_batch(self, sentences, workers=None, chunk_size=64):
+        """여러 문장을 process pool에서 분석하여 입력 순서대로 반환"""
+        return parallel.tag_batch(self, sentences, workers, chunk_size)
+
+    def tag_stream(self, sentences, workers=None, chunk_size=64):
+        """문장 iterable을 process pool에서 분석하여 입력 순서대로 하나씩 반환"""
+        return parallel.tag_stream(self, sentences, workers, chunk_size)
+
     def _sentence_lookup(self, sentence):
         """문장을 어절 단위로 분해"""
         sent = []
@@ -106,35 +603,90 @@ class HMMTagger:
     def _eojeol_lookup(self, eojeol, offset=0):
         """어절/품사로 들어온 입력을 분리하여 단어/품사/품사/시작/끝 형태의
         튜플로 반환"""
+        pos = self._eojeol_cache.get(eojeol)
+        if pos is None:
+            pos = self._build_eojeol_lattice(eojeol)
+            self._eojeol_cache.put(eojeol, pos)
+
+        # 캐시된 lattice는 offset 0 기준이므로 위치를 옮겨서 복사
+        return [[(morphs, tag0, tag1, b+offset, e+offset)
+                 for morphs, tag0, tag1, b, e in words] for words in pos]
+
+    def _build_eojeol_lattice(self, eojeol):
+        """어절의 각 위치에서 시작하는 단어/용언 후보 생성"""
+        if self.prefilter and self._eomi_index is None:
+            self._build_lemma_index()
+        index = self._index
         n = len(eojeol)
         pos = [[] for _ in range(n)]
         for b in range(n):
+            # b에서 시작하는 사전 단어
+            words = dict(index.prefix_search(eojeol, b))
             for r in range(1, self._max_word_len+1):
                 e = b + r
                 if e > n:
                     continue
                 surface = eojeol[b:e]
-                for tag in self._get_pos(surface):
-                    pos[b].append((surface, tag, tag, b+offset, e+offset))
+                for tag in words.get(e, ()):
+                    pos[b].append((surface, tag, tag, b, e))
                 # 용언 분리 시도
                 for i in range(1, r+1):
-                    suffix_len = r - i
-                    try:
-                        lemmas = self._lemmatize(surface, i)
-                        if lemmas:
-                            for morphs, tag0, tag1 in lemmas:
-                                pos[b].append((morphs, tag0, tag1, b+offset, e+offset))
-                    except:
+                    if self.prefilter and not self._can_lemmatize(surface[:i], surface[i:]):
                         continue
+                    for morphs, tag0, tag1 in self._cached_lemmatize(surface, i):
+                        pos[b].append((morphs, tag0, tag1, b, e))
         return pos
 
+    def _cached_lemmatize(self, word, i):
+        """캐시를 이용한 _lemmatize. 분리할 수 없는 경우 빈 리스트 반환"""
+        key = (word, i)
+        lemmas = self._lemma_cache.get(key)
+        if lemmas is None:
+            self._lemma_attempts += 1
+            try:
+                lemmas = self._lemmatize(word, i)
+            except (TypeError, ValueError):
+                # 한글이 아닌 글자(decompose가 None)나 자모만 있는 글자(compose 실패)
+                lemmas = []
+            self._lemma_cache.put(key, lemmas)
+        return lemmas
+
+    def _build_lemma_index(self):
+        """lemma_candidate가 만드는 어간/어미 후보를 미리 거르기 위한 index
+
+        lemma_candidate(l, r)의 어미 후보는 r, (한 글자) + r, (한 글자) + r[1:]
+        중 하나이고, 어간 후보는 l, l[:-1] + (한 글자), l[:-1] + (두 글자),
+        l + (한 글자) 중 하나이다. 따라서 어미 e[1:]의 집합에 r 또는 r[1:]이
+        없거나, 어간 s[:-1], s[:-2]의 집합에 l 또는 l[:-1]이 없으면 분리 결과가
+        없다.
+        """
+        self._eomi_index = set()
+        for eomi in self.emission.get('Eomi', {}):
+            self._add_lemma_index('Eomi', eomi)
+        self._stem_index = set()
+        for tag in ('Verb', 'Adjective'):
+            for stem in self.emission.get(tag, {}):
+                self._add_lemma_index(tag, stem)
+
+    def _add_lemma_index(self, tag, word):
+        # 아직 index를 만들지 않았으면 나중에 emission으로부터 만들 때 포함됨
+        if self._eomi_index is None:
+            return
+        if tag == 'Eomi':
+            self._eomi_index.add(word[1:])
+        elif tag == 'Verb' or tag == 'Adjective':
+            self._stem_index.add(word[:-1])
+            self._stem_index.add(word[:-2])
+
+    def _can_lemmatize(self, l, r):
+        eomi_index = self._eomi_index
+        stem_index = self._stem_index
+        return ((r in eomi_index or r[1:] in eomi_index) and
+                (l in stem_index or l[:-1] in stem_index))
+
     def _get_pos(self, sub):
         """주어진 어휘가 속하는 품사 전체를 리턴 """
-        tags = []
-        for tag, words in self.emission.items():
-            if sub in words:
-                tags.append(tag)
-        return tags
+        return list(self._index.get_tags(sub))
 
     def _lemmatize(self, word, i):
         """주어진 용언을 어간/어미로 분리"""
@@ -142,7 +694,7 @@ class HMMTagger:
         r = word[i:]
         lemmas = []
         len_word = len(word)
-        for l_, r_ in lemma_candidate(l, r):
+        for l_, r_ in (lemma_candidate or _import_lemma_candidate())(l, r):
             word_ = l_ + ' + ' + r_
             if (l_ in self.emission['Verb']) and (r_ in self.emission['Eomi']):
                 lemmas.append((word_, 'Verb', 'Eomi'))
@@ -150,81 +702,171 @@ class HMMTagger:
                 lemmas.append((word_, 'Adjective', 'Eomi'))
         return lemmas
 
-    def _generate_link(self, sentence):
+    def _generate_link(self, sentence, sent=None):
+        """lattice의 노드 리스트와 edge 배열 생성
 
-        def get_nonempty_first(sent, end, offset=0):
-            """offset으로 부터 가장 먼저 등장하는 단어 인덱스 반환"""
-            for i in range(offset, end):
-                if sent[i]:
-                    return i
-            return offset
-
-        chars = sentence.replace(' ', '')
-        sent = self._sentence_lookup(sentence)
+        노드는 어절별 단어 후보, 단어가 없는 구간의 Unk, BOS, EOS이며 edge는
+        노드의 index 쌍 (src[i], dst[i])이다. 리턴값은 (nodes, src, dst, bos, eos)
+        이며 bos, eos는 BOS / EOS 노드의 index
+        """
+        # _sentence_lookup과 같이 모든 공백 문자(탭, 줄바꿈 등)를 기준으로 어절을 나눔
+        chars = ''.join(sentence.split())
+        if sent is None:
+            sent = self._sentence_lookup(sentence)
         n_char = len(sent) + 1
 
         # EOS 등록
-        eos = ('EOS', 'EOS', 'EOS', n_char-1, n_char)
-        sent.append([eos])
+        sent.append([('EOS', 'EOS', 'EOS', n_char-1, n_char)])
+
+        # 위치별로 그 위치부터 처음 단어가 등장하는 위치 (EOS 위치에는 항상 있음)
+        nonempty_first = list(range(n_char))
+        for i in range(n_char-2, -1, -1):
+            if not sent[i]:
+                nonempty_first[i] = nonempty_first[i+1]
 
         # 첫 단어가 등장하는 인덱스가 0보다 크면
         # 그 인덱스까지를 Unk로 등록
-        i = get_nonempty_first(sent, n_char)
+        i = nonempty_first[0]
         if i > 0:
             sent[0].append((chars[:i], 'Unk', 'Unk', 0, i))
 
-        links = []
-        for words in sent[:-1]:
-            for word in words:
-                begin = word[3]
-                end = word[4]
-                # 현재 단어의 끝점에서 시작하는 단어가 없는 경우는
-                # 그 끝점 이후 처음으로 등장하는 단어의 시작점까지를
-                # Unk로 등록
-                if not sent[end]:
-                    b = get_nonempty_first(sent, n_char, end)
-                    unk = (chars[end:b], 'Unk', 'Unk', end, b)
-                    links.append((word, unk))
-                # 아닌 경우는 단어들을 edge로 등록
-                else:
-                    for adjacent in sent[end]:
-                        links.append((word, adjacent))
-
-        # Unk로 시작하는 edge 등록
-        unks = {to_node for _, to_node in links if to_node[1] == 'Unk'}
-        for unk in unks:
-            for adjacent in sent[unk[3]]:
-                links.append((unk, adjacent))
+        nodes = [word for words in sent for word in words]
+        eos = len(nodes) - 1
+        # 위치별로 그 위치에서 시작하는 노드의 (첫 index, 개수).
+        # 노드는 끝 위치의 노드들과 연결된다 (EOS의 끝 위치는 없음)
+        sizes = np.zeros(n_char+1, dtype=np.int64)
+        sizes[:n_char] = [len(words) for words in sent]
+        firsts = np.zeros(n_char+1, dtype=np.int64)
+        np.cumsum(sizes[:-1], out=firsts[1:])
+        ends = np.array([word[4] for word in nodes], dtype=np.int64)
 
+        # 현재 단어의 끝점에서 시작하는 단어가 없는 경우는
+        # 그 끝점 이후 처음으로 등장하는 단어의 시작점까지를
+        # Unk로 등록하고, 끝점의 노드 대신 Unk와 연결
+        for end in np.unique(ends[sizes[ends] == 0]).tolist():
+            if end == n_char:
+                continue
+            b = nonempty_first[end]
+            firsts[end] = len(nodes)
+            sizes[end] = 1
+            nodes.append((chars[end:b], 'Unk', 'Unk', end, b))
         # BOS 등록
-        bos = ('BOS', 'BOS', 'BOS', 0, 0)
-        for word in sent[0]:
-            links.append((bos, word))
-        links = sorted(links, key=lambda x:(x[0][3], x[1][4]))
+        bos = len(nodes)
+        nodes.append(('BOS', 'BOS', 'BOS', 0, 0))
+        ends = np.append(ends, [node[4] for node in nodes[len(ends):]])
 
-        return links, bos, eos
+        # 노드마다 끝 위치의 노드들과 edge 생성 (노드 순서, 끝 위치의 노드 순서)
+        counts = sizes[ends]
+        src = np.repeat(np.arange(len(nodes)), counts)
+        offsets = np.repeat(firsts[ends] - (np.cumsum(counts) - counts), counts)
+        dst = offsets + np.arange(len(src))
 
-    def _add_weight(self, links):
-        """링크된 점들 사이의 edge를 만들어 그래프 생성"""
+        # 정렬은 _add_weight에서 점수 계산과 함께 수행
+        return nodes, src, dst, bos, eos
 
-        def weight(from_node, to_node):
-            morphs = to_node[0].split(' + ')
+    def _build_transition_matrix(self):
+        """품사 id와 품사간 transition 점수 행렬 생성. 없는 transition은 최소 점수"""
+        tags = list(self.emission)
+        for pos0, pos1 in self.transition:
+            tags += [pos0, pos1]
+        tags += list(self.begin) + ['BOS', 'EOS', 'Unk']
+        self._tag2id = {}
+        for tag in tags:
+            self._tag2id.setdefault(tag, len(self._tag2id))
 
-            # 첫 단어의 점수
-            w = self.emission.get(to_node[1], {}).get(morphs[0], self._min_emission)
-            w += self.transition.get((from_node[2], to_node[1]), self._min_transition)
+        self._id2tag = list(self._tag2id)
 
-            # 두번째 단어의 점수 (용언의 어미 부분)
-            if len(morphs) == 2:
-                w += self.emission.get(to_node[2], {}).get(morphs[1], self._min_emission)
-                w += self.transition.get((from_node[2], to_node[2]), self._min_transition)
-            return w
+        n = len(self._tag2id)
+        self._transition_matrix = np.full((n, n), self._min_transition, dtype=np.float64)
+        for (pos0, pos1), score in self.transition.items():
+            self._transition_matrix[self._tag2id[pos0], self._tag2id[pos1]] = score
+
+        # Unk 품사 추론용 테이블
+        # 앞 품사별 뒤 품사 점수 (incoming), 뒤 품사별 앞 품사 점수 (outgoing)
+        # 존재하지 않는 transition은 mask로 구분하고 점수는 0
+        # 점수가 같은 경우 기존처럼 먼저 등록된 transition을 선택하기 위한 순서
+        mask = np.zeros((n, n), dtype=bool)
+        rank = np.zeros((n, n), dtype=np.int64)
+        for i, (pos0, pos1) in enumerate(self.transition):
+            mask[self._tag2id[pos0], self._tag2id[pos1]] = True
+            rank[self._tag2id[pos0], self._tag2id[pos1]] = i
+        scores = np.where(mask, self._transition_matrix, 0.0)
+        self._incoming_scores, self._incoming_mask, self._incoming_rank = scores, mask, rank
+        self._outgoing_scores = np.ascontiguousarray(scores.T)
+        self._outgoing_mask = np.ascontiguousarray(mask.T)
+        self._outgoing_rank = np.ascontiguousarray(rank.T)
+        self._begin_mask = np.zeros(n, dtype=bool)
+        self._begin_scores = np.zeros(n, dtype=np.float64)
+        self._begin_rank = np.zeros(n, dtype=np.int64)
+        for i, (tag, score) in enumerate(self.begin.items()):
+            self._begin_mask[self._tag2id[tag]] = True
+            self._begin_scores[self._tag2id[tag]] = score
+            self._begin_rank[self._tag2id[tag]] = i
+
+    def _build_suffix_model(self):
+        """사전 단어의 마지막 글자별 품사 로그 확률 log P(품사 | 마지막 글자)"""
+        self._suffix_counts = {}
+        for tag, words in self.emission.items():
+            for word in words:
+                self._add_suffix_count(word, tag)
+        self._suffix_scores = {
+            char:self._suffix_score(counts) for char, counts in self._suffix_counts.items()}
+
+    def _add_suffix_count(self, word, tag, count=1):
+        counts = self._suffix_counts.setdefault(
+            word[-1], np.zeros(len(self._tag2id), dtype=np.float64))
+        counts[self._tag2id[tag]] += count
+
+    def _suffix_score(self, counts):
+        # add-one smoothing
+        return np.log((counts + 1) / (counts.sum() + len(counts)))
 
-        graph = []
-        for from_node, to_node in links:
-            edge = (from_node, to_node, weight(from_node, to_node))
-            graph.append(edge)
-        return graph
+    def _add_weight(self, nodes, src, dst):
+        """_generate_link의 edge에 점수를 매겨 그래프 생성
+
+        노드별 품사 id / emission 점수 배열을 만든 뒤, 모든 edge의 transition
+        점수를 행렬 indexing으로 한 번에 계산한다. 리턴값은 (시작 위치 순으로 정렬한)
+        [(시작 노드 index, 끝 노드 index, 점수), ...]
+        """
+        tag2id = self._tag2id
+        emission = self.emission
+        min_emission = self._min_emission
+        n = len(nodes)
+        tag0 = np.empty(n, dtype=np.int64)
+        tag1 = np.empty(n, dtype=np.int64)
+        begin = np.empty(n, dtype=np.int64)
+        end = np.empty(n, dtype=np.int64)
+        emission0 = np.empty(n, dtype=np.float64)
+        emission1 = np.zeros(n, dtype=np.float64)
+        two_morphs = np.zeros(n, dtype=bool)
+        for i, (word, t0, t1, b, e) in enumerate(nodes):
+            tag0[i] = tag2id[t0]
+            tag1[i] = tag2id[t1]
+            begin[i] = b
+            end[i] = e
+            if t0 == t1:
+                # 첫 단어의 점수
+                emission0[i] = emission.get(t0, {}).get(word, min_emission)
+            else:
+                # 용언은 어간과 어미의 점수
+                morphs = word.split(' + ')
+                emission0[i] = emission.get(t0, {}).get(morphs[0], min_emission)
+                if len(morphs) == 2:
+                    emission1[i] = emission.get(t1, {}).get(morphs[1], min_emission)
+                    two_morphs[i] = True
+
+        # edge 정렬 (stable)
+        order = np.lexsort((end[dst], begin[src]))
+        src = src[order]
+        dst = dst[order]
+
+        # 점수 계산 (기존과 같은 덧셈 순서 유지)
+        prev_tag = tag1[src]
+        weight = emission0[dst] + self._transition_matrix[prev_tag, tag0[dst]]
+        weight2 = (weight + emission1[dst]) + self._transition_matrix[prev_tag, tag1[dst]]
+        weight = np.where(two_morphs[dst], weight2, weight)
+
+        return list(zip(src.tolist(), dst.tolist(), weight.tolist()))
 
     def _flatten(self, path):
         """용언을 어간+어미 형태로 표현된 부분을 두 개로 분리"""
@@ -237,6 +879,7 @@ class HMMTagger:
         return pos
 
     def _inference_unknown(self, pos):
+        tag2id = self._tag2id
         pos_ = []
         for i, pos_i in enumerate(pos[:-1]):
             if not (pos_i[1] == 'Unk'):
@@ -246,23 +889,35 @@ class HMMTagger:
             # Unk 토큰인 경우 추론 프로세스
             # 이전 토큰의 품사 정보 반영
             if i == 1:
-                tag_prob = self.begin.copy()
+                in_scores, in_mask, in_rank = \
+                    self._begin_scores, self._begin_mask, self._begin_rank
             else:
-                tag_prob = {
-                    tag:prob for (prev_tag, tag), prob in self.transition.items()
-                    if prev_tag == pos[i-1][1]
-                }
+                prev_tag = tag2id[pos[i-1][1]]
+                in_scores = self._incoming_scores[prev_tag]
+                in_mask = self._incoming_mask[prev_tag]
+                in_rank = self._incoming_rank[prev_tag]
 
             # 이후 토큰의 품사 정보 반영
-            for (tag, next_tag), prob in self.transition.items():
-                if next_tag == pos[i+1][1]:
-                    tag_prob[tag] = tag_prob.get(tag, 0) + prob
+            next_tag = tag2id[pos[i+1][1]]
+            scores = in_scores + self._outgoing_scores[next_tag]
+            mask = in_mask | self._outgoing_mask[next_tag]
 
             # 이렇게 찾아지지 않은 품사이면 명사로 예측
-            if not tag_prob:
+            if not mask.any():
                 infered_tag = 'Noun'
             else:
-                infered_tag = sorted(tag_prob, key=lambda x:-tag_prob[x])[0]
+                # 마지막 글자 기반 품사 점수 반영
+                if self.unknown_suffix_weight:
+                    suffix = self._suffix_scores.get(pos_i[0][-1])
+                    if suffix is not None:
+                        scores = scores + self.unknown_suffix_weight * suffix
+                scores = np.where(mask, scores, -np.inf)
+                best = np.flatnonzero(scores == scores.max())
+                # 동점이면 이전 품사와의 transition, 이후 품사와의 transition 순으로 먼저 등록된 품사
+                if len(best) > 1:
+                    out_rank = self._outgoing_rank[next_tag]
+                    best = sorted(best, key=lambda t:(0, in_rank[t]) if in_mask[t] else (1, out_rank[t]))
+                infered_tag = self._id2tag[best[0]]
             pos_.append((pos_i[0], infered_tag))
 
         return pos_ + pos[-1:]
@@ -272,19 +927,163 @@ class HMMTagger:
         return pos[1:-1]
 
     def add_user_dictionary(self, word, tag, score):
-        if not (tag in self.emission):
-            self.emission[tag] = {word: score}
-        else:
-            self.emission[tag][word] = score
+        self.add_user_entries([(word, tag, score)])
+
+    def load_user_dictionary(self, path, layer=None, default_score=0.0):
+        """사용자 사전 파일 (tsv 또는 .npz)을 add_user_entries로 등록"""
+        self.add_user_entries(read_user_dictionary(path, default_score), layer)
+
+    def add_user_entries(self, entries, layer=None):
+        """(단어, 품사, 점수)들을 사용자 사전으로 한 번에 등록
+
+        emission 테이블과 단어 최대 길이, 최소 emission 점수, 단어 index,
+        어간/어미 prefilter index, 마지막 글자 기반 품사 점수를 함께 갱신하며,
+        캐시는 마지막에 한 번만 비운다. layer를 지정하면 remove_user_dictionary로
+        제거할 수 있는 층으로 등록한다. 같은 (단어, 품사)가 여러 층에 있으면
+        나중에 추가한 층의 점수를 사용한다. layer 없이 등록한 단어는 모든 층의
+        아래에 놓이며 제거할 수 없다.
+        """
+        if layer is not None:
+            layer_entries = self._user_layers.setdefault(layer, {})
+
+        touched = set()
+        for word, tag, score in entries:
+            key = (word, tag)
+            if layer is None:
+                if key in self._user_base:
+                    # 층에 덮어씌워진 단어는 층 아래의 점수만 바꿈
+                    self._user_base[key] = score
+                    score = self._user_score(key)
+            else:
+                if key not in self._user_base:
+                    self._user_base[key] = self.emission.get(tag, {}).get(word)
+                layer_entries[key] = score
+                score = self._user_score(key)
+            self._set_user_score(word, tag, score, touched)
+        self._finish_user_update(touched)
+
+    def remove_user_dictionary(self, layer):
+        """add_user_entries / load_user_dictionary로 등록한 층을 제거
+
+        층이 덮어쓴 단어는 아래 층 또는 원래 모델의 점수로 되돌아가며, 층에서
+        새로 추가한 단어는 emission 테이블과 단어 index에서 삭제된다.
+        단어 최대 길이, 최소 점수, prefilter index는 줄이지 않는다. (남아있어도
+        lattice를 만들 때 확인하는 후보가 늘어날 뿐 결과는 같다.)
+        """
+        touched = set()
+        for key in self._user_layers.pop(layer):
+            score = self._user_score(key)
+            if not any(key in entries for entries in self._user_layers.values()):
+                del self._user_base[key]
+            self._set_user_score(key[0], key[1], score, touched)
+        self._finish_user_update(touched)
+
+    def user_dictionaries(self):
+        """등록된 사용자 사전 층의 이름과 단어 수"""
+        return {layer:len(entries) for layer, entries in self._user_layers.items()}
+
+    def _user_score(self, key):
+        """가장 나중에 추가한 층의 점수. 어느 층에도 없으면 원래 점수"""
+        for entries in reversed(list(self._user_layers.values())):
+            if key in entries:
+                return entries[key]
+        return self._user_base[key]
+
+    def _set_user_score(self, word, tag, score, touched):
+        """emission 점수를 바꾸고 단어 index 등을 갱신. score가 None이면 삭제"""
+        if tag not in self.emission:
+            if score is None:
+                return
+            self.emission[tag] = {}
+            # 새 품사는 품사 id가 바뀌므로 transition 행렬과 suffix 모델을 다시 생성
+            self._build_transition_matrix()
+            if self.unknown_suffix_weight:
+                self._build_suffix_model()
+        words = self.emission[tag]
+        exists = word in words
+
+        if score is None:
+            if exists:
+                del words[word]
+                if self._word_index is not None:
+                    self._word_index.remove(word, tag)
+                if self.unknown_suffix_weight:
+                    self._add_suffix_count(word, tag, -1)
+                    touched.add(word[-1])
+            return
+
+        words[word] = score
+        self._max_word_len = max(self._max_word_len, len(word))
+        self._min_emission = min(self._min_emission, score - 0.05)
+        if not exists:
+            # 단어 index를 아직 만들지 않았으면 나중에 emission으로부터 만들 때 포함됨
+            if self._word_index is not None:
+                self._word_index.add(word, tag)
+            if self.prefilter:
+                self._add_lemma_index(tag, word)
+            if self.unknown_suffix_weight:
+                self._add_suffix_count(word, tag)
+                touched.add(word[-1])
+
+    def _finish_user_update(self, touched):
+        for char in touched:
+            self._suffix_scores[char] = self._suffix_score(self._suffix_counts[char])
+        self.clear_cache()
+
+    def clear_cache(self):
+        self._lemma_cache.clear()
+        self._eojeol_cache.clear()
+
+    def cache_info(self):
+        """용언 분리 / 어절 lattice 캐시의 hit/miss/eviction 통계"""
+        return {
+            'lemma': self._lemma_cache.info(),
+            'eojeol': self._eojeol_cache.info(),
+        }
 
 if  __name__ == '__main__':
     args = parser.parse_args()
     text = args.text
     json_path = args.json_path
     
-    emission, transition, begin = load_from_json(json_path)
-
-    #print("transition", transition)
-    hmm_tagger = HMMTagger(emission, transition, begin)
+    if args.compact:
+        hmm_tagger = HMMTagger.from_model(
+            load_compact(args.model_path or json_path), engine=args.engine,
+            beam_width=args.beam_width)
+    elif args.model_path:
+        hmm_tagger = HMMTagger.from_model(
+            load_from_binary(args.model_path), engine=args.engine,
+            beam_width=args.beam_width)
+    else:
+        hmm_tagger = HMMTagger.from_json(json_path, engine=args.engine,
+                                         beam_width=args.beam_width)
+    for path in args.user_dict:
+        hmm_tagger.load_user_dictionary(path, layer=path)
     #print(hmm_tagger.tag('tt도예시였다'))
-    print(hmm_tagger.tag(text))
+    if args.document:
+        if text is None:
+            f_in = sys.stdin if args.input_path == '-' else open(args.input_path, 'r')
+            text = f_in.read()
+            if f_in is not sys.stdin:
+                f_in.close()
+        f_out = sys.stdout if args.output_path == '-' else open(args.output_path, 'w')
+        for pos in hmm_tagger.tag_document(text, args.max_eojeols, workers=args.workers or None):
+            f_out.write('%s\t%s\t%d\t%d\n' % pos)
+        if f_out is not sys.stdout:
+            f_out.close()
+    elif text is not None and args.nbest > 1:
+        for pos, score in hmm_tagger.tag_nbest(text, args.nbest):
+            print('%.4f' % score, pos)
+    elif text is not None:
+        print(hmm_tagger.tag(text))
+    else:
+        # 파일 / 표준 입력의 문서를 한 줄에 한 문장씩 분석
+        f_in = sys.stdin if args.input_path == '-' else open(args.input_path, 'r')
+        f_out = sys.stdout if args.output_path == '-' else open(args.output_path, 'w')
+        sentences = (line.strip() for line in f_in)
+        for pos in hmm_tagger.tag_stream(sentences, workers=args.workers or None):
+            f_out.write(str(pos) + '\n')
+        if f_in is not sys.stdin:
+            f_in.close()
+        if f_out is not sys.stdout:
+            f_out.close()
@@ -0,0 +1,90 @@
+"""server.py로 실행한 품사 분석 서버의 클라이언트"""
+import json
+import socket
+import argparse
+import http.client
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="품사 분석 서버 클라이언트")
+
+# argument
+parser.add_argument('--host', type=str, default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8000)
+inputs = parser.add_mutually_exclusive_group(required=True)
+inputs.add_argument('--text', type=str)
+# 한 줄에 한 문장씩 들어있는 파일
+inputs.add_argument('--input_path', type=str)
+inputs.add_argument('--reload', type=str, nargs='?', const='', help='서버의 모델 다시 불러오기')
+
+class TaggerClient:
+    def __init__(self, host='127.0.0.1', port=8000, timeout=60):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else None
+            conn.request(method, path, body, {'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            result = json.loads(response.read())
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise RuntimeError('%d: %s' % (response.status, result.get('error')))
+        return result
+
+    def tag(self, text):
+        """한 문장 분석 (HTTP)"""
+        return [tuple(p) for p in self._request('POST', '/tag', {'text': text})['pos']]
+
+    def tag_batch(self, texts):
+        """여러 문장을 한 요청으로 분석 (HTTP). 분석에 실패한 문장은 RuntimeError"""
+        response = self._request('POST', '/tag', {'texts': list(texts)})
+        results = [None if pos is None else [tuple(p) for p in pos] for pos in response['pos']]
+        for error in response.get('errors', []):
+            results[error['index']] = RuntimeError(error['error'])
+        return results
+
+    def tag_stream(self, texts):
+        """NDJSON 연결 하나로 문장들을 연이어 보내고 입력 순서대로 결과 반환"""
+        texts = list(texts)
+        with socket.create_connection((self.host, self.port), self.timeout) as sock:
+            lines = b''.join(
+                json.dumps({'id': i, 'text': text}, ensure_ascii=False).encode('utf-8') + b'\n'
+                for i, text in enumerate(texts))
+            sock.sendall(lines)
+            sock.shutdown(socket.SHUT_WR)
+            results = [None] * len(texts)
+            with sock.makefile('rb') as f:
+                for line in f:
+                    response = json.loads(line)
+                    if 'error' in response:
+                        results[response['id']] = RuntimeError(response['error'])
+                    else:
+                        results[response['id']] = [tuple(p) for p in response['pos']]
+        return results
+
+    def reload(self, model_path=None):
+        payload = {'model_path': model_path} if model_path else {}
+        return self._request('POST', '/reload', payload)
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def stats(self):
+        return self._request('GET', '/stats')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    client = TaggerClient(args.host, args.port)
+    if args.text is not None:
+        print(client.tag(args.text))
+    elif args.reload is not None:
+        print(client.reload(args.reload or None))
+    else:
+        with open(args.input_path) as f:
+            texts = [line.strip() for line in f]
+        for pos in client.tag_stream(texts):
+            print(pos)
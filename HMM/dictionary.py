@@ -0,0 +1,126 @@
+import numpy as np
+
+
+class WordIndex:
+    """단어 -> 품사 목록 역색인과 글자 단위 trie
+
+    emission 테이블로부터 한 번 생성하며, trie를 이용하여 주어진 위치에서
+    시작하는 사전 단어를 (common prefix search) 더 이상 이어지는 단어가
+    없을 때까지 찾는다.
+    """
+    # trie 노드에서 단어의 끝을 표시하는 키 (글자는 빈 문자열이 될 수 없음)
+    _END = ''
+
+    def __init__(self, emission=None):
+        self.word2tags = {}
+        self.trie = {}
+        if emission:
+            for tag, words in emission.items():
+                for word in words:
+                    self.add(word, tag)
+
+    def __contains__(self, word):
+        return word in self.word2tags
+
+    def __len__(self):
+        return len(self.word2tags)
+
+    def add(self, word, tag):
+        """단어/품사 등록. 이미 등록된 경우 무시"""
+        tags = self.word2tags.get(word)
+        if tags is None:
+            tags = self.word2tags[word] = []
+            node = self.trie
+            for char in word:
+                node = node.setdefault(char, {})
+            node[self._END] = tags
+        if tag not in tags:
+            tags.append(tag)
+
+    def remove(self, word, tag):
+        """단어/품사 삭제. 품사가 남지 않은 단어는 trie에서도 삭제"""
+        tags = self.word2tags.get(word)
+        if not tags or tag not in tags:
+            return
+        tags.remove(tag)
+        if tags:
+            return
+        del self.word2tags[word]
+        # 단어의 끝 표시를 지우고, 자식이 없어진 노드를 뒤에서부터 삭제
+        path = [self.trie]
+        for char in word:
+            path.append(path[-1][char])
+        del path[-1][self._END]
+        for i in range(len(word), 0, -1):
+            if path[i]:
+                break
+            del path[i-1][word[i-1]]
+
+    def get_tags(self, word):
+        """주어진 단어가 속하는 품사 목록"""
+        return self.word2tags.get(word, [])
+
+    def prefix_search(self, text, begin=0, max_len=0):
+        """text[begin:]의 접두사 중 사전에 등록된 단어를 (end, tags) 형태로 반환
+
+        args:
+            text (str) : 탐색할 문자열
+            begin (int) : 탐색 시작 위치
+            max_len (int) : 단어의 최대 길이. 0이면 제한하지 않는다.
+        """
+        end = len(text) if not max_len else min(len(text), begin + max_len)
+        matches = []
+        node = self.trie
+        for e in range(begin, end):
+            node = node.get(text[e])
+            # 더 이어지는 단어가 없으면 중단
+            if node is None:
+                break
+            tags = node.get(self._END)
+            if tags:
+                matches.append((e + 1, tags))
+        return matches
+
+def read_user_dictionary(path, default_score=0.0):
+    """사용자 사전 파일의 (단어, 품사, 점수)들
+
+    .npz 파일은 save_user_dictionary로 저장한 바이너리 사전이며, 그 외에는 한 줄에
+    '단어\t품사\t점수' 하나씩 들어있는 tsv 파일이다. tsv의 점수는 생략할 수
+    있으며, 생략하면 default_score를 사용한다. 빈 줄과 '#'으로 시작하는 줄은 무시한다.
+    """
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            offsets = data['offsets'].tolist()
+            pool = data['pool'].tobytes()
+            tags = data['tags'].tolist()
+            tag_ids = data['tag_ids'].tolist()
+            scores = data['scores'].tolist()
+        for i, (tag_id, score) in enumerate(zip(tag_ids, scores)):
+            yield pool[offsets[i]:offsets[i+1]].decode('utf-8'), tags[tag_id], score
+        return
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'):
+                continue
+            cols = line.split('\t')
+            score = float(cols[2]) if len(cols) > 2 and cols[2] else default_score
+            yield cols[0], cols[1], score
+
+def save_user_dictionary(entries, path):
+    """(단어, 품사, 점수)들을 read_user_dictionary로 읽을 수 있는 바이너리 사전(.npz)으로 저장"""
+    tag2id = {}
+    encoded, tag_ids, scores = [], [], []
+    for word, tag, score in entries:
+        encoded.append(word.encode('utf-8'))
+        tag_ids.append(tag2id.setdefault(tag, len(tag2id)))
+        scores.append(score)
+    offsets = np.zeros(len(encoded)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(w) for w in encoded])
+    np.savez(path,
+             offsets=offsets,
+             pool=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+             tags=np.array(list(tag2id), dtype=str),
+             tag_ids=np.array(tag_ids, dtype=np.int32),
+             scores=np.array(scores, dtype=np.float64))
@@ -0,0 +1,62 @@
+"""품사 분석 서버 부하 테스트
+
+concurrency개의 NDJSON 연결에서 동시에 요청을 보내고 처리량과
+지연 시간 분위수를 출력한다.
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="품사 분석 서버 부하 테스트")
+
+# argument
+parser.add_argument('--host', type=str, default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8000)
+parser.add_argument('--input_path', type=str, required=True, help='한 줄에 한 문장씩 들어있는 파일')
+parser.add_argument('--num_requests', type=int, default=1000)
+parser.add_argument('--concurrency', type=int, default=16)
+parser.add_argument('--seed', type=int, default=0)
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q / 100))] if values else 0.0
+
+async def worker(host, port, requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i, text in requests:
+            begin = time.perf_counter()
+            writer.write(json.dumps({'id': i, 'text': text}, ensure_ascii=False).encode('utf-8') + b'\n')
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - begin)
+            if 'error' in response:
+                errors.append(response['error'])
+    finally:
+        writer.close()
+
+async def run(args):
+    with open(args.input_path) as f:
+        texts = [line.strip() for line in f if line.strip()]
+    rng = random.Random(args.seed)
+    requests = [(i, rng.choice(texts)) for i in range(args.num_requests)]
+
+    latencies, errors = [], []
+    begin = time.perf_counter()
+    await asyncio.gather(*[
+        worker(args.host, args.port, requests[i::args.concurrency], latencies, errors)
+        for i in range(args.concurrency)])
+    elapsed = time.perf_counter() - begin
+
+    print('requests     : %d (errors %d)' % (len(latencies), len(errors)))
+    print('elapsed      : %.3fs' % elapsed)
+    print('throughput   : %.1f req/s' % (len(latencies) / elapsed))
+    for q in (50, 90, 99):
+        print('p%-11d: %.2fms' % (q, percentile(latencies, q) * 1000))
+    print('max          : %.2fms' % (max(latencies) * 1000))
+
+if __name__ == '__main__':
+    asyncio.run(run(parser.parse_args()))
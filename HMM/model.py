@@ -0,0 +1,477 @@
+"""메모리 매핑이 가능한 바이너리 모델 포맷
+
+파일 구조:
+    MAGIC (8 bytes) | header 길이 (uint32) | header (json) | 배열들 (8 bytes 정렬)
+
+header에는 품사 목록, 모델 통계, 각 배열의 (offset, dtype, shape)가 기록된다.
+배열은 다음과 같다.
+    vocab_offsets (int64, n_words+1) / vocab_pool (uint8) : 사전순으로 정렬된 단어들의 utf-8 string pool
+    emission_indptr (int64, n_words+1) : 단어별 (품사, 점수) 구간
+    emission_tags (int32) / emission_scores (float64) : 단어별 품사 id와 emission 점수
+    transition (float64, n_tags x n_tags) : 품사간 transition 점수. 없는 경우 nan
+    begin (float64, n_tags) : 시작 품사 점수. 없는 경우 nan
+
+파일을 mmap으로 읽으므로 같은 모델을 사용하는 여러 프로세스가 한 벌의
+페이지를 공유한다. CompactModel은 같은 배열을 프로세스 메모리에 올리되 단어를
+정렬된 str 리스트로 풀어두어 단어 검색을 bisect 모듈로 빠르게 수행한다.
+"""
+import json
+import mmap
+import struct
+import argparse
+from bisect import bisect_left
+from collections.abc import Mapping, MutableMapping
+
+import numpy as np
+
+from dictionary import WordIndex
+
+MAGIC = b'HMMBIN01'
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="json 모델을 바이너리 모델로 변환")
+
+# argument
+parser.add_argument('--json_path', type=str, default='data/trained_corpus_type1.json')
+parser.add_argument('--save_path', type=str, default='data/trained_corpus_type1.bin')
+
+def _align(n, size=8):
+    return (n + size - 1) // size * size
+
+def build_arrays(emission, transition, begin):
+    """emission/transition/begin 테이블을 품사 목록, 모델 통계, 배열들로 변환
+
+    transition의 key는 (앞 품사, 뒤 품사) 튜플이다. 통계는 테이블을 한 번
+    순회하면서 함께 계산한다.
+    """
+    # 품사 id. emission의 품사 순서를 유지하여 단어별 품사 목록의 순서를 보존
+    tags = list(emission)
+    for pos0, pos1 in transition:
+        for tag in (pos0, pos1):
+            if tag not in tags:
+                tags.append(tag)
+    for tag in begin:
+        if tag not in tags:
+            tags.append(tag)
+    tag2id = {tag:i for i, tag in enumerate(tags)}
+
+    # 단어별 (품사, 점수)
+    word2scores = {}
+    for tag, words in emission.items():
+        tag_id = tag2id[tag]
+        for word, score in words.items():
+            word2scores.setdefault(word, []).append((tag_id, score))
+    vocab = sorted(word2scores)
+
+    encoded = [word.encode('utf-8') for word in vocab]
+    vocab_offsets = np.zeros(len(vocab)+1, dtype=np.int64)
+    vocab_offsets[1:] = np.cumsum([len(w) for w in encoded])
+    vocab_pool = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+    emission_indptr = np.zeros(len(vocab)+1, dtype=np.int64)
+    emission_indptr[1:] = np.cumsum([len(word2scores[w]) for w in vocab])
+    emission_tags = np.array(
+        [t for w in vocab for t, _ in word2scores[w]], dtype=np.int32)
+    emission_scores = np.array(
+        [s for w in vocab for _, s in word2scores[w]], dtype=np.float64)
+
+    transition_ = np.full((len(tags), len(tags)), np.nan, dtype=np.float64)
+    for (pos0, pos1), score in transition.items():
+        transition_[tag2id[pos0], tag2id[pos1]] = score
+    begin_ = np.full(len(tags), np.nan, dtype=np.float64)
+    for tag, score in begin.items():
+        begin_[tag2id[tag]] = score
+
+    arrays = {
+        'vocab_offsets': vocab_offsets,
+        'vocab_pool': vocab_pool,
+        'emission_indptr': emission_indptr,
+        'emission_tags': emission_tags,
+        'emission_scores': emission_scores,
+        'transition': transition_,
+        'begin': begin_,
+    }
+
+    stats = {
+        'max_word_len': max(len(w) for w in vocab),
+        'min_emission': float(emission_scores.min()),
+        'min_transition': min(transition.values()),
+    }
+    return tags, stats, arrays
+
+def save_binary(emission, transition, begin, path):
+    """emission/transition/begin 테이블을 바이너리 모델로 저장
+
+    transition의 key는 (앞 품사, 뒤 품사) 튜플이다.
+    """
+    tags, stats, arrays = build_arrays(emission, transition, begin)
+
+    # header의 길이가 offset에 영향을 주므로 offset은 배열 영역 기준으로 기록
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [offset, array.dtype.str, list(array.shape)]
+        offset = _align(offset + array.nbytes)
+    header = json.dumps(
+        {'tags': tags, 'stats': stats, 'arrays': layout}, ensure_ascii=False
+    ).encode('utf-8')
+    data_offset = _align(len(MAGIC) + 4 + len(header))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_offset - f.tell()))
+        for name, array in arrays.items():
+            f.write(b'\0' * (data_offset + layout[name][0] - f.tell()))
+            f.write(array.tobytes())
+
+def convert_json(json_path, save_path):
+    """train.py가 저장한 json 모델을 바이너리 모델로 변환"""
+    with open(json_path, 'r') as f:
+        trained = json.load(f)
+    transition = {tuple(k.split("_")):v for k, v in trained['transition'].items()}
+    save_binary(trained['emission'], transition, trained['begin'], save_path)
+
+def _read_binary(path):
+    """바이너리 모델 파일을 mmap으로 열어 (mmap, 품사 목록, 모델 통계, 배열들)을 리턴"""
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a binary HMM model: %s' % path)
+    header_len, = struct.unpack_from('<I', mm, len(MAGIC))
+    header_begin = len(MAGIC) + 4
+    header = json.loads(mm[header_begin:header_begin+header_len].decode('utf-8'))
+    data_offset = _align(header_begin + header_len)
+
+    arrays = {}
+    for name, (offset, dtype, shape) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        array = np.frombuffer(mm, dtype=dtype, count=count, offset=data_offset+offset)
+        arrays[name] = array.reshape(shape)
+    return mm, header['tags'], header['stats'], arrays
+
+class BinaryModel:
+    """바이너리 모델을 mmap으로 읽어 HMMTagger가 사용하는 테이블 형태로 제공"""
+    def __init__(self, path):
+        self.path = path
+        self._mmap, self.tags, self.stats, arrays = _read_binary(path)
+        self.tag2id = {tag:i for i, tag in enumerate(self.tags)}
+        for name, array in arrays.items():
+            setattr(self, '_' + name, array)
+
+        self.emission = EmissionTable(self)
+        self.transition = TransitionTable(self)
+        self.begin = BeginTable(self)
+        self.index = BinaryWordIndex(self)
+
+    def __len__(self):
+        return len(self._vocab_offsets) - 1
+
+    def word(self, i):
+        b, e = self._vocab_offsets[i], self._vocab_offsets[i+1]
+        return self._vocab_pool[b:e].tobytes().decode('utf-8')
+
+    def _word_bytes(self, i):
+        b, e = self._vocab_offsets[i], self._vocab_offsets[i+1]
+        return self._vocab_pool[b:e].tobytes()
+
+    def _bisect(self, key, lo=0, hi=None):
+        """정렬된 string pool에서 key(bytes)가 들어갈 위치"""
+        hi = len(self) if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def word_id(self, word):
+        """단어 id. 없는 단어이면 -1"""
+        key = word.encode('utf-8')
+        i = self._bisect(key)
+        if i < len(self) and self._word_bytes(i) == key:
+            return i
+        return -1
+
+    def scores(self, word_id):
+        """단어의 (품사 id 배열, 점수 배열)"""
+        b, e = self._emission_indptr[word_id], self._emission_indptr[word_id+1]
+        return self._emission_tags[b:e], self._emission_scores[b:e]
+
+    def score(self, word_id, tag_id):
+        """단어의 tag_id 품사 emission 점수. 없으면 None"""
+        tags, scores = self.scores(word_id)
+        for tag_id_, score in zip(tags, scores):
+            if tag_id_ == tag_id:
+                return float(score)
+        return None
+
+class CompactModel:
+    """바이너리 모델의 배열을 프로세스 메모리에 올린 모델
+
+    단어는 정렬된 str 리스트 하나에만 저장하며 (단어 id는 리스트의 위치),
+    단어별 품사 id / emission 점수는 CSR 형태의 numpy 배열로 저장한다.
+    점수는 기본적으로 float32로 저장하므로 float64 점수와 비교하여 점수 차가
+    아주 작은 경로 사이에서는 분석 결과가 달라질 수 있다. 같은 결과가 필요하면
+    score_dtype=np.float64를 지정한다. 단어 검색과 common prefix search는
+    bisect 모듈로 수행한다.
+    """
+    def __init__(self, tags, stats, arrays, score_dtype=np.float32):
+        self.tags = list(tags)
+        self.tag2id = {tag:i for i, tag in enumerate(self.tags)}
+        self.stats = dict(stats)
+
+        offsets = arrays['vocab_offsets'].tolist()
+        pool = arrays['vocab_pool'].tobytes()
+        self.words = [pool[b:e].decode('utf-8') for b, e in zip(offsets, offsets[1:])]
+
+        tag_dtype = np.int8 if len(self.tags) < 128 else np.int32
+        self._emission_indptr = np.array(arrays['emission_indptr'], dtype=np.int32)
+        self._emission_tags = np.array(arrays['emission_tags'], dtype=tag_dtype)
+        self._emission_scores = np.array(arrays['emission_scores'], dtype=score_dtype)
+        self._transition = np.array(arrays['transition'], dtype=np.float64)
+        self._begin = np.array(arrays['begin'], dtype=np.float64)
+
+        self.emission = EmissionTable(self)
+        self.transition = TransitionTable(self)
+        self.begin = BeginTable(self)
+        self.index = CompactWordIndex(self)
+
+    @classmethod
+    def from_tables(cls, emission, transition, begin, score_dtype=np.float32):
+        """emission/transition/begin 테이블로부터 생성"""
+        return cls(*build_arrays(emission, transition, begin), score_dtype=score_dtype)
+
+    @classmethod
+    def from_binary(cls, path, score_dtype=np.float32):
+        """바이너리 모델 파일로부터 생성. 배열을 복사하므로 파일은 공유하지 않음"""
+        _, tags, stats, arrays = _read_binary(path)
+        return cls(tags, stats, arrays, score_dtype=score_dtype)
+
+    def __len__(self):
+        return len(self.words)
+
+    def word(self, i):
+        return self.words[i]
+
+    def word_id(self, word):
+        """단어 id. 없는 단어이면 -1"""
+        i = bisect_left(self.words, word)
+        if i < len(self.words) and self.words[i] == word:
+            return i
+        return -1
+
+    def scores(self, word_id):
+        """단어의 (품사 id 배열, 점수 배열)"""
+        b, e = self._emission_indptr[word_id:word_id+2].tolist()
+        return self._emission_tags[b:e], self._emission_scores[b:e]
+
+    def score(self, word_id, tag_id):
+        """단어의 tag_id 품사 emission 점수. 없으면 None"""
+        b, e = self._emission_indptr[word_id:word_id+2].tolist()
+        tags = self._emission_tags[b:e].tolist()
+        if tag_id in tags:
+            return float(self._emission_scores[b + tags.index(tag_id)])
+        return None
+
+class TagWords(MutableMapping):
+    """한 품사의 단어 -> emission 점수. 사용자 사전은 overlay에 기록"""
+    def __init__(self, model, tag_id):
+        self._model = model
+        self._tag_id = tag_id
+        self._overlay = {}
+
+    def _lookup(self, word):
+        word_id = self._model.word_id(word)
+        if word_id >= 0:
+            score = self._model.score(word_id, self._tag_id)
+            if score is not None:
+                return score
+        raise KeyError(word)
+
+    def __getitem__(self, word):
+        if word in self._overlay:
+            return self._overlay[word]
+        return self._lookup(word)
+
+    def __setitem__(self, word, score):
+        self._overlay[word] = score
+
+    def __delitem__(self, word):
+        del self._overlay[word]
+
+    def __iter__(self):
+        model = self._model
+        # 품사가 일치하는 (단어, 품사) 위치를 단어 id로 변환
+        entries = np.nonzero(model._emission_tags == self._tag_id)[0]
+        word_ids = np.searchsorted(model._emission_indptr, entries, side='right') - 1
+        for word_id in word_ids.tolist():
+            word = model.word(word_id)
+            if word not in self._overlay:
+                yield word
+        yield from self._overlay
+
+    def __len__(self):
+        return int((self._model._emission_tags == self._tag_id).sum()) + sum(
+            1 for word in self._overlay if not self._in_model(word))
+
+    def _in_model(self, word):
+        try:
+            self._lookup(word)
+        except KeyError:
+            return False
+        return True
+
+class EmissionTable(MutableMapping):
+    """품사 -> (단어 -> emission 점수) 테이블"""
+    def __init__(self, model):
+        self._model = model
+        self._tables = {tag:TagWords(model, i) for i, tag in enumerate(model.tags)
+                        if (model._emission_tags == i).any()}
+
+    def __getitem__(self, tag):
+        return self._tables[tag]
+
+    def __setitem__(self, tag, words):
+        # 모델에 없는 품사는 사용자 사전으로만 구성
+        table = TagWords(self._model, -1)
+        table.update(words)
+        self._tables[tag] = table
+
+    def __delitem__(self, tag):
+        del self._tables[tag]
+
+    def __iter__(self):
+        return iter(self._tables)
+
+    def __len__(self):
+        return len(self._tables)
+
+class TransitionTable(Mapping):
+    """(앞 품사, 뒤 품사) -> transition 점수"""
+    def __init__(self, model):
+        self._model = model
+
+    def __getitem__(self, key):
+        tag2id = self._model.tag2id
+        pos0, pos1 = key
+        if pos0 not in tag2id or pos1 not in tag2id:
+            raise KeyError(key)
+        score = self._model._transition[tag2id[pos0], tag2id[pos1]]
+        if np.isnan(score):
+            raise KeyError(key)
+        return float(score)
+
+    def __iter__(self):
+        tags = self._model.tags
+        for i, j in zip(*np.nonzero(~np.isnan(self._model._transition))):
+            yield (tags[i], tags[j])
+
+    def __len__(self):
+        return int((~np.isnan(self._model._transition)).sum())
+
+class BeginTable(Mapping):
+    """시작 품사 -> 점수"""
+    def __init__(self, model):
+        self._model = model
+
+    def __getitem__(self, tag):
+        if tag not in self._model.tag2id:
+            raise KeyError(tag)
+        score = self._model._begin[self._model.tag2id[tag]]
+        if np.isnan(score):
+            raise KeyError(tag)
+        return float(score)
+
+    def __iter__(self):
+        tags = self._model.tags
+        for i in np.nonzero(~np.isnan(self._model._begin))[0]:
+            yield tags[i]
+
+    def __len__(self):
+        return int((~np.isnan(self._model._begin)).sum())
+
+class BinaryWordIndex:
+    """정렬된 string pool 위에서 동작하는 WordIndex.
+
+    common prefix search는 접두사를 공유하는 단어 구간을 bisect로 좁혀가며,
+    구간이 비면 중단한다. 사용자 사전은 별도의 WordIndex에 기록한다.
+    """
+    def __init__(self, model):
+        self._model = model
+        self._overlay = WordIndex()
+
+    def __contains__(self, word):
+        return self._model.word_id(word) >= 0 or word in self._overlay
+
+    def add(self, word, tag):
+        self._overlay.add(word, tag)
+
+    def remove(self, word, tag):
+        """사용자 사전으로 추가한 단어/품사 삭제. 모델의 단어는 삭제할 수 없음"""
+        self._overlay.remove(word, tag)
+
+    def _tags(self, word_id):
+        tags = self._model.tags
+        return [tags[i] for i in self._model.scores(word_id)[0]]
+
+    def _merge(self, tags, word):
+        extra = self._overlay.get_tags(word)
+        if extra:
+            tags = tags + [tag for tag in extra if tag not in tags]
+        return tags
+
+    def get_tags(self, word):
+        word_id = self._model.word_id(word)
+        tags = self._tags(word_id) if word_id >= 0 else []
+        return self._merge(tags, word)
+
+    def prefix_search(self, text, begin=0, max_len=0):
+        end = len(text) if not max_len else min(len(text), begin + max_len)
+        matches = self._prefix_matches(text, begin, end)
+
+        # 사용자 사전 단어 병합
+        found = dict(matches)
+        for e, tags in self._overlay.prefix_search(text, begin, max_len):
+            tags_ = found.get(e, [])
+            found[e] = tags_ + [tag for tag in tags if tag not in tags_]
+        return sorted(found.items())
+
+    def _prefix_matches(self, text, begin, end):
+        model = self._model
+        matches = []
+        lo, hi = 0, len(model)
+        for e in range(begin, end):
+            if lo >= hi:
+                break
+            key = text[begin:e+1].encode('utf-8')
+            lo = model._bisect(key, lo, hi)
+            hi = model._bisect(key + b'\xff', lo, hi)
+            if lo < hi and model._word_bytes(lo) == key:
+                matches.append((e + 1, self._tags(lo)))
+        return matches
+
+class CompactWordIndex(BinaryWordIndex):
+    """CompactModel의 정렬된 단어 리스트 위에서 동작하는 WordIndex"""
+    def _prefix_matches(self, text, begin, end):
+        words = self._model.words
+        matches = []
+        lo, hi = 0, len(words)
+        for e in range(begin, end):
+            key = text[begin:e+1]
+            lo = bisect_left(words, key, lo, hi)
+            # key로 시작하는 단어들은 key와 key + (가장 큰 글자) 사이에 위치
+            hi = bisect_left(words, key + '\U0010ffff', lo, hi)
+            if lo >= hi:
+                break
+            if words[lo] == key:
+                matches.append((e + 1, self._tags(lo)))
+        return matches
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    convert_json(args.json_path, args.save_path)
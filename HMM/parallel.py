@@ -0,0 +1,70 @@
+import os
+import multiprocessing
+from collections import deque
+from itertools import islice
+
+# fork로 생성된 worker가 상속받는 tagger.
+# emission/transition 테이블을 작업마다 pickle하지 않고 부모 프로세스의
+# 메모리를 (copy-on-write로) 그대로 사용한다.
+_worker_tagger = None
+
+
+def _tag_chunk(sentences, method='tag'):
+    tag = getattr(_worker_tagger, method)
+    return [tag(sentence) for sentence in sentences]
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def tag_stream(tagger, sentences, workers=None, chunk_size=64, max_pending=None,
+               method='tag'):
+    """문장들을 process pool에서 품사 분석하여 입력 순서대로 하나씩 반환
+
+    처리 중이거나 반환을 기다리는 chunk는 최대 max_pending개로 유지되므로
+    입력이 아무리 길어도 메모리 사용량은 일정하다.
+
+    args:
+        tagger (HMMTagger) : worker가 상속받을 tagger
+        sentences (iterable of str) : 분석할 문장들
+        workers (int) : worker 수. None이면 CPU 수, 1이면 현재 프로세스에서 분석
+        chunk_size (int) : worker에 한 번에 전달하는 문장 수
+        max_pending (int) : 동시에 처리 중인 chunk 수의 상한. None이면 workers * 2
+        method (str) : 문장마다 호출할 tagger의 메소드 이름 (예: 'tag_with_offsets')
+    """
+    global _worker_tagger
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        tag = getattr(tagger, method)
+        for sentence in sentences:
+            yield tag(sentence)
+        return
+
+    max_pending = max_pending or workers * 2
+    # 지연 초기화 항목을 fork 전에 준비하여 worker들이 공유
+    tagger.prepare()
+    _worker_tagger = tagger
+    ctx = multiprocessing.get_context('fork')
+    try:
+        with ctx.Pool(workers) as pool:
+            pending = deque()
+            for chunk in _chunked(sentences, chunk_size):
+                pending.append(pool.apply_async(_tag_chunk, (chunk, method)))
+                if len(pending) >= max_pending:
+                    yield from pending.popleft().get()
+            while pending:
+                yield from pending.popleft().get()
+    finally:
+        _worker_tagger = None
+
+
+def tag_batch(tagger, sentences, workers=None, chunk_size=64):
+    """문장 리스트를 process pool에서 품사 분석하여 입력 순서대로 반환"""
+    return list(tag_stream(tagger, sentences, workers, chunk_size))
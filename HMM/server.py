@@ -0,0 +1,305 @@
+"""모델을 한 번만 불러오고 계속 실행되는 품사 분석 서버
+
+하나의 포트에서 HTTP와 newline-delimited JSON(NDJSON) 프로토콜을 모두 받는다.
+연결의 첫 줄이 HTTP 요청 줄이면 HTTP, 아니면 NDJSON으로 처리한다.
+
+HTTP:
+    POST /tag     {"text": "문장"} 또는 {"texts": ["문장", ...]}
+    POST /reload  {"model_path": "새 모델 경로"} (생략하면 기존 경로를 다시 읽음)
+    GET  /health
+    GET  /stats
+
+NDJSON (한 줄에 요청 하나, 응답도 한 줄에 하나):
+    {"id": 1, "text": "문장"}  ->  {"id": 1, "pos": [["형태소", "품사"], ...]}
+
+동시에 들어온 요청은 batch로 묶어 process pool에서 분석한다. 새 모델을
+불러올 때 (POST /reload, SIGHUP) 처리 중인 요청은 기존 pool에서 마저 처리된다.
+"""
+import os
+import json
+import signal
+import asyncio
+import argparse
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from HMM import HMMTagger, load_from_binary
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="세종 말뭉치 품사 분석 서버")
+
+# argument
+parser.add_argument('--model_path', type=str, default='data/trained_corpus_type1.json',
+                    help='json 모델 또는 model.py로 변환한 바이너리 모델 (.bin)')
+parser.add_argument('--host', type=str, default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8000)
+parser.add_argument('--workers', type=int, default=0)
+parser.add_argument('--batch_size', type=int, default=64)
+parser.add_argument('--max_wait_ms', type=float, default=5.0)
+# NDJSON 연결 하나에서 동시에 처리하는 최대 요청 수. 넘으면 다음 줄을 읽지 않고 기다림
+parser.add_argument('--max_pending', type=int, default=256)
+# 사용자 사전 파일들 (tsv 또는 .npz). 모델을 다시 불러올 때마다 새로 읽는다.
+parser.add_argument('--user_dict', type=str, nargs='*', default=[])
+
+HTTP_METHODS = (b'GET ', b'POST ', b'PUT ', b'HEAD ', b'DELETE ')
+
+# fork로 생성된 worker가 상속받는 tagger (세대별)
+_taggers = {}
+_worker_tagger = None
+# worker가 fork 시점에 상속받는 서버/연결 socket의 fd
+_socket_fds = set()
+
+def _init_worker(generation):
+    global _worker_tagger
+    _worker_tagger = _taggers[generation]
+    # 상속받은 socket을 닫지 않으면 부모가 연결을 닫아도 클라이언트에 EOF가
+    # 전달되지 않고, 서버가 종료된 뒤에도 worker가 포트를 점유한다.
+    for fd in _socket_fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def _tag_sentences(sentences):
+    results = []
+    for sentence in sentences:
+        try:
+            results.append((True, _worker_tagger.tag(sentence)))
+        except Exception as e:
+            results.append((False, repr(e)))
+    return results
+
+def _check_texts(texts):
+    """요청의 문장 리스트 확인. 문자열 하나가 문자 단위로 분석되지 않도록 list만 받음"""
+    if not isinstance(texts, list):
+        raise TypeError('texts must be a list of str, not %s' % type(texts).__name__)
+    for text in texts:
+        if not isinstance(text, str):
+            raise TypeError('text must be str, not %s' % type(text).__name__)
+    return texts
+
+def load_tagger(model_path, user_dicts=()):
+    """모델 파일 형식에 맞게 tagger 생성. 사용자 사전은 파일 경로를 층 이름으로 등록"""
+    if model_path.endswith('.bin'):
+        tagger = HMMTagger.from_model(load_from_binary(model_path))
+    else:
+        tagger = HMMTagger.from_json(model_path)
+    for path in user_dicts:
+        tagger.load_user_dictionary(path, layer=path)
+    # worker를 fork하기 전에 지연 초기화 항목을 준비
+    return tagger.prepare()
+
+class TaggingServer:
+    def __init__(self, model_path, workers=0, batch_size=64, max_wait_ms=5.0, user_dicts=(),
+                 max_pending=256):
+        self.model_path = model_path
+        self.user_dicts = list(user_dicts)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_pending = max_pending
+        self._generation = itertools.count()
+        self._queue = None
+        self._pool = None
+        self._in_flight = 0
+        self.stats = {'requests': 0, 'sentences': 0, 'batches': 0, 'errors': 0, 'reloads': 0}
+
+    def _create_pool(self, tagger):
+        generation = next(self._generation)
+        _taggers[generation] = tagger
+        pool = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker, initargs=(generation,))
+        return pool, generation
+
+    async def start(self, host, port):
+        loop = asyncio.get_running_loop()
+        tagger = await loop.run_in_executor(None, load_tagger, self.model_path, self.user_dicts)
+        self._pool, self._pool_generation = self._create_pool(tagger)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._batch_loop())
+        try:
+            loop.add_signal_handler(
+                signal.SIGHUP, lambda: asyncio.ensure_future(self.reload()))
+        except (NotImplementedError, AttributeError):
+            pass
+        server = await asyncio.start_server(self._handle, host, port)
+        _socket_fds.update(sock.fileno() for sock in server.sockets)
+        return server
+
+    async def reload(self, model_path=None):
+        """새 모델을 불러와 pool을 교체. 기존 pool은 처리 중인 batch가 끝난 뒤 종료"""
+        loop = asyncio.get_running_loop()
+        model_path = model_path or self.model_path
+        tagger = await loop.run_in_executor(None, load_tagger, model_path, self.user_dicts)
+        old_pool, old_generation = self._pool, self._pool_generation
+        self._pool, self._pool_generation = self._create_pool(tagger)
+        self.model_path = model_path
+        self.stats['reloads'] += 1
+
+        await loop.run_in_executor(None, old_pool.shutdown, True)
+        _taggers.pop(old_generation, None)
+
+    async def tag(self, sentences):
+        """문장들을 batch 큐에 넣고 결과를 기다림"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for sentence in sentences:
+            future = loop.create_future()
+            await self._queue.put((sentence, future))
+            futures.append(future)
+        self.stats['requests'] += 1
+        self.stats['sentences'] += len(sentences)
+        return await asyncio.gather(*futures)
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            # 최대 max_wait 동안 batch_size까지 요청을 모음
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.stats['batches'] += 1
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        try:
+            # pool은 제출하는 시점에 읽는다. batch를 만든 뒤 reload가 pool을
+            # 교체하고 기존 pool을 종료했을 수 있으므로, 그 사이에 await가 없어야 함
+            results = await loop.run_in_executor(
+                self._pool, _tag_sentences, [sentence for sentence, _ in batch])
+        except Exception as e:
+            results = [(False, repr(e))] * len(batch)
+        finally:
+            self._in_flight -= 1
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _handle(self, reader, writer):
+        fd = writer.get_extra_info('socket').fileno()
+        _socket_fds.add(fd)
+        try:
+            first = await reader.readline()
+            if first.startswith(HTTP_METHODS):
+                await self._handle_http(first, reader, writer)
+            else:
+                await self._handle_ndjson(first, reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            _socket_fds.discard(fd)
+            writer.close()
+
+    async def _handle_ndjson(self, line, reader, writer):
+        # 한 연결에서 연이어 들어온 요청들도 함께 batch로 묶이도록 동시에 처리.
+        # 응답은 끝나는 순서대로 쓰며 id로 요청을 구분한다. 처리 중인 요청이
+        # max_pending개이면 하나가 끝날 때까지 다음 줄을 읽지 않는다.
+        pending = asyncio.Semaphore(self.max_pending)
+
+        async def respond(line):
+            try:
+                response = await self._ndjson_response(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+            finally:
+                pending.release()
+
+        tasks = set()
+        while line:
+            if line.strip():
+                await pending.acquire()
+                task = asyncio.ensure_future(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            line = await reader.readline()
+        await asyncio.gather(*tasks)
+
+    async def _ndjson_response(self, line):
+        request = {}
+        try:
+            request = json.loads(line)
+            (ok, result), = await self.tag(_check_texts([request['text']]))
+        except (ValueError, KeyError, TypeError) as e:
+            ok, result = False, repr(e)
+        response = {'id': request.get('id')} if isinstance(request, dict) else {}
+        if ok:
+            response['pos'] = result
+        else:
+            self.stats['errors'] += 1
+            response['error'] = result
+        return response
+
+    async def _handle_http(self, request_line, reader, writer):
+        method, path = request_line.decode('latin-1').split()[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+        status, response = 200, None
+        try:
+            payload = json.loads(body) if body else {}
+            if method == 'GET' and path == '/health':
+                response = {'status': 'ok', 'model_path': self.model_path}
+            elif method == 'GET' and path == '/stats':
+                response = dict(self.stats, in_flight=self._in_flight, queued=self._queue.qsize())
+            elif method == 'POST' and path == '/reload':
+                await self.reload(payload.get('model_path'))
+                response = {'status': 'reloaded', 'model_path': self.model_path}
+            elif method == 'POST' and path == '/tag':
+                if 'texts' in payload:
+                    texts = _check_texts(payload['texts'])
+                    results = await self.tag(texts)
+                    # 분석에 실패한 문장은 pos가 null이며 errors에 위치와 오류를 기록
+                    response = {'pos': [result if ok else None for ok, result in results]}
+                    errors = [{'index': i, 'error': result}
+                              for i, (ok, result) in enumerate(results) if not ok]
+                    if errors:
+                        self.stats['errors'] += len(errors)
+                        response['errors'] = errors
+                else:
+                    (ok, result), = await self.tag(_check_texts([payload['text']]))
+                    if ok:
+                        response = {'pos': result}
+                    else:
+                        self.stats['errors'] += 1
+                        status, response = 500, {'error': result}
+            else:
+                status, response = 404, {'error': 'Not found: %s %s' % (method, path)}
+        except (ValueError, KeyError, TypeError) as e:
+            status, response = 400, {'error': repr(e)}
+        except Exception as e:
+            status, response = 500, {'error': repr(e)}
+
+        data = json.dumps(response, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 500: 'Internal Server Error'}[status]
+        writer.write(('HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=utf-8\r\n'
+                      'Content-Length: %d\r\nConnection: close\r\n\r\n' % (
+                          status, reason, len(data))).encode('latin-1') + data)
+        await writer.drain()
+
+async def serve(args):
+    server = TaggingServer(args.model_path, args.workers, args.batch_size, args.max_wait_ms,
+                           args.user_dict, args.max_pending)
+    tcp_server = await server.start(args.host, args.port)
+    print('Serving on %s:%d' % (args.host, args.port))
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+if __name__ == '__main__':
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,200 @@
+"""형태소 id로 변환한 세종 코퍼스의 shard 파일
+
+한 번 변환해두면 학습할 때마다 코퍼스 텍스트를 다시 파싱하지 않는다.
+
+디렉토리 구조:
+    vocab.json : 형태소 목록, 품사 목록, shard별 문장 / 형태소 수, 원본 파일 정보
+    shard-00000.morphs.npy (int32) : 형태소 id
+    shard-00000.tags.npy (int16) : 품사 id
+    shard-00000.offsets.npy (int64, 문장 수+1) : 문장별 형태소 구간
+    ...
+
+vocab.json은 모든 shard를 쓴 뒤 마지막에 저장되므로, 이 파일이 있으면 변환이
+완료된 것이다. 배열은 np.load(mmap_mode='r')로 읽으므로 여러 프로세스가
+페이지를 공유한다.
+"""
+import os
+import json
+import shutil
+import argparse
+from array import array
+from multiprocessing import Pool
+
+import numpy as np
+
+from train import find_shards, _read_shard, merge_counts
+from utils import iter_sentences
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="세종 코퍼스를 형태소 id shard 파일로 변환")
+
+# argument
+parser.add_argument('--data_path', type=str, default='data/corpus_type1_all.txt')
+parser.add_argument('--save_path', type=str, default='data/corpus_type1_shards')
+# shard 수. 0이면 64MB당 하나 (최소 workers개)
+parser.add_argument('--num_shards', type=int, default=0)
+parser.add_argument('--workers', type=int, default=1)
+
+SHARD_BYTES = 64 * 1024 * 1024
+
+def _shard_path(path, i, kind):
+    return os.path.join(path, 'shard-%05d.%s.npy' % (i, kind))
+
+def _encode_shard(shard):
+    """코퍼스 파일의 (시작, 끝) byte 구간을 shard 안에서만 유효한 id 배열로 변환"""
+    data_path, begin, end = shard
+    morph2id, tag2id = {}, {}
+    morph_ids, tag_ids, offsets = array('i'), array('i'), array('q', [0])
+    for sent in iter_sentences(_read_shard(data_path, begin, end)):
+        for morph, tag in sent:
+            morph_ids.append(morph2id.setdefault(morph, len(morph2id)))
+            tag_ids.append(tag2id.setdefault(tag, len(tag2id)))
+        offsets.append(len(morph_ids))
+    return list(morph2id), list(tag2id), morph_ids, tag_ids, offsets
+
+def _remap(vocab2id, words):
+    return np.array([vocab2id.setdefault(w, len(vocab2id)) for w in words], dtype=np.int64)
+
+def convert_corpus(data_path, save_path, num_shards=0, workers=1):
+    """코퍼스 파일을 shard 파일들로 변환
+
+    shard는 문장 경계에서 나눈 파일의 byte 구간이며, workers개의 프로세스에서
+    나누어 파싱한다. shard별 id는 처음 등장한 순서대로 전체 id로 바꾸어 저장하므로
+    id의 순서는 코퍼스를 처음부터 읽으며 부여한 순서와 같다.
+    """
+    size = os.path.getsize(data_path)
+    num_shards = num_shards or max(workers, -(-size // SHARD_BYTES))
+    shards = [(data_path, b, e) for b, e in find_shards(data_path, num_shards)]
+
+    tmp_path = save_path.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    morph2id, tag2id = {}, {}
+    meta = []
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        encoded = pool.imap(_encode_shard, shards) if pool else map(_encode_shard, shards)
+        for i, (morphs, tags, morph_ids, tag_ids, offsets) in enumerate(encoded):
+            morph_map = _remap(morph2id, morphs)
+            tag_map = _remap(tag2id, tags)
+            np.save(_shard_path(tmp_path, i, 'morphs'),
+                    morph_map[np.frombuffer(morph_ids, dtype=np.int32)].astype(np.int32))
+            np.save(_shard_path(tmp_path, i, 'tags'),
+                    tag_map[np.frombuffer(tag_ids, dtype=np.int32)].astype(np.int16))
+            np.save(_shard_path(tmp_path, i, 'offsets'), np.frombuffer(offsets, dtype=np.int64))
+            meta.append({'sentences': len(offsets) - 1, 'morphs': len(morph_ids)})
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    stat = os.stat(data_path)
+    vocab = {
+        'morphs': list(morph2id),
+        'tags': list(tag2id),
+        'shards': meta,
+        'source': '%s:%d:%d' % (os.path.abspath(data_path), stat.st_size, stat.st_mtime_ns),
+    }
+    with open(os.path.join(tmp_path, 'vocab.json'), 'w', encoding='utf-8') as f:
+        json.dump(vocab, f, ensure_ascii=False)
+    shutil.rmtree(save_path, ignore_errors=True)
+    os.rename(tmp_path, save_path)
+
+class CorpusShards:
+    """convert_corpus로 변환한 코퍼스. utils.Corpus처럼 여러 번 순회할 수 있으며,
+    순회하면 [(형태소, 품사), ...] 형태의 문장을 하나씩 반환한다.
+
+    shard(i)는 shard 하나의 (형태소 id, 품사 id, 문장 offset) 배열을 mmap으로 읽는다.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'vocab.json'), encoding='utf-8') as f:
+            vocab = json.load(f)
+        self.morphs = vocab['morphs']
+        self.tags = vocab['tags']
+        self.shard_info = vocab['shards']
+        # CRF Trainer의 feature cache key로 사용
+        self.fingerprint = 'shards:%s:%s' % (os.path.abspath(path), vocab['source'])
+
+    @property
+    def num_shards(self):
+        return len(self.shard_info)
+
+    def __len__(self):
+        return sum(info['sentences'] for info in self.shard_info)
+
+    def shard(self, i):
+        """i번째 shard의 (형태소 id, 품사 id, 문장 offset) 배열"""
+        return tuple(np.load(_shard_path(self.path, i, kind), mmap_mode='r')
+                     for kind in ('morphs', 'tags', 'offsets'))
+
+    def iter_shards(self):
+        for i in range(self.num_shards):
+            yield self.shard(i)
+
+    def iter_arrays(self):
+        """문장별 (형태소 id 배열, 품사 id 배열)"""
+        for morph_ids, tag_ids, offsets in self.iter_shards():
+            offsets = offsets.tolist()
+            for b, e in zip(offsets, offsets[1:]):
+                yield morph_ids[b:e], tag_ids[b:e]
+
+    def __iter__(self):
+        morphs, tags = self.morphs, self.tags
+        for morph_ids, tag_ids, offsets in self.iter_shards():
+            sent_morphs = [morphs[i] for i in morph_ids.tolist()]
+            sent_tags = [tags[i] for i in tag_ids.tolist()]
+            offsets = offsets.tolist()
+            for b, e in zip(offsets, offsets[1:]):
+                yield list(zip(sent_morphs[b:e], sent_tags[b:e]))
+
+def _ordered_counts(keys):
+    """keys의 값별 (값, 빈도)를 처음 등장한 순서대로"""
+    values, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.argsort(first, kind='stable')
+    return zip(values[order].tolist(), counts[order].tolist())
+
+def count_shard(morph_ids, tag_ids, offsets, morphs, tags):
+    """shard 배열로 train.count_corpus와 같은 빈도를 계산. key의 순서도 같다."""
+    lengths = np.diff(offsets)
+    starts = np.asarray(offsets[:-1])[lengths > 0]
+    ends = np.asarray(offsets[1:])[lengths > 0]
+    tag_ids = np.asarray(tag_ids, dtype=np.int64)
+    n_tags = len(tags)
+
+    pos2words = {}
+    keys = tag_ids * len(morphs) + morph_ids
+    for key, count in _ordered_counts(keys):
+        tag, morph = divmod(key, len(morphs))
+        pos2words.setdefault(tags[tag], {})[morphs[morph]] = count
+
+    # 형태소마다 다음 품사와의 bigram. 문장의 마지막 형태소는 EOS와의 bigram
+    next_tags = np.empty_like(tag_ids)
+    next_tags[:-1] = tag_ids[1:]
+    next_tags[ends - 1] = n_tags
+    tags_ = list(tags) + ['EOS']
+    trans = {}
+    for key, count in _ordered_counts(tag_ids * (n_tags + 1) + next_tags):
+        pos0, pos1 = divmod(key, n_tags + 1)
+        trans[(tags_[pos0], tags_[pos1])] = count
+
+    bos = {tags[tag]:count for tag, count in _ordered_counts(tag_ids[starts])}
+    return pos2words, trans, bos
+
+def _count_shard(args):
+    path, i = args
+    corpus = CorpusShards(path)
+    return count_shard(*corpus.shard(i), corpus.morphs, corpus.tags)
+
+def count_shards(path, workers=1):
+    """shard 파일들의 빈도를 프로세스별로 센 뒤 합산. count_corpus와 같은 결과"""
+    tasks = [(path, i) for i in range(CorpusShards(path).num_shards)]
+    if workers > 1:
+        with Pool(workers) as pool:
+            return merge_counts(pool.map(_count_shard, tasks))
+    return merge_counts(map(_count_shard, tasks))
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    convert_corpus(args.data_path, args.save_path, args.num_shards, args.workers)
@@ -1,9 +1,11 @@
+import os
 import math
 import json
 import argparse
 from collections import defaultdict
+from multiprocessing import Pool
 
-from utils import read_corpus, as_bigram_tag
+from utils import read_corpus, iter_sentences
 
 # Argparse setting
 parser = argparse.ArgumentParser(description="세종 말뭉치 품사/단어별 빈도수 산출")
@@ -12,71 +14,245 @@ parser = argparse.ArgumentParser(description="세종 말뭉치 품사/단어별
 parser.add_argument('--data_path', type=str, default='data/corpus_type1_all.txt')
 parser.add_argument('--num_lines', type=int, default=0)
 parser.add_argument('--save_path', type=str, default='data/trained_corpus_type1.json')
+parser.add_argument('--workers', type=int, default=1)
+# 기존 모델에 data_path의 말뭉치를 추가로 반영하는 경우 기존 모델의 위치
+parser.add_argument('--update_path', type=str, default=None)
+# shards.py로 변환한 코퍼스. 지정하면 data_path 대신 사용
+parser.add_argument('--shards_path', type=str, default=None)
+
+def _emission_log_prob(words):
+    """한 품사의 단어 등장 확률 (로그)"""
+    base = sum(words.values())
+    return {word:math.log(count/base) for word, count in words.items()}
+
+def _transition_log_prob(transition, rows=None):
+    """transition 확률 (로그). rows가 주어지면 해당 품사에서 시작하는 transition만 계산"""
+    base = defaultdict(int)
+    for (pos0, pos1), count in transition.items():
+        if rows is None or pos0 in rows:
+            base[pos0] += count
+    return {'_'.join([pos0, pos1]):math.log(count/base[pos0])
+            for (pos0, pos1), count in transition.items()
+            if rows is None or pos0 in rows}
 
 def _to_log_prob(pos2words, transition, bos):
-    """계산의 편의를 위해 곱셈을 덧셈으로 변경"""
+    """계산의 편의를 위해 곱셈을 덧셈으로 변경
+
+    transition의 key는 (앞 품사, 뒤 품사) 튜플이며, 결과의 key는
+    '앞품사_뒤품사' 형태의 문자열이다.
+    """
 
     # 품사별 단어 등장 확률 (로그)
-    base = {pos:sum(words.values()) for pos, words in pos2words.items()}
-    pos2words_ = {pos:{word:math.log(count/base[pos]) for word, count in words.items()}
-                      for pos, words in pos2words.items()}
+    pos2words_ = {pos:_emission_log_prob(words) for pos, words in pos2words.items()}
 
     # transition 확률 (로그)
-    base = defaultdict(int)
-    for pos0_pos1, count in transition.items():
-        base[pos0_pos1.split("_")[0]] += count
-    transition_ = {pos:math.log(count/base[pos0_pos1.split("_")[0]]) for pos, count in transition.items()}
+    transition_ = _transition_log_prob(transition)
 
     # 시작 확률
-    base = sum(bos.values())
-    bos_ = {pos:math.log(count/base) for pos, count in bos.items()}
+    bos_ = _emission_log_prob(bos)
 
     return pos2words_, transition_, bos_
 
-def train(corpus):
-    """말뭉치를 불러온 후 품사별 단어 빈도, 품사간 연속 빈도, 시작 빈도를 계산하여 리턴"""
-    pos2words = defaultdict(lambda: defaultdict(int))
-    trans = defaultdict(int)
-    bos = defaultdict(int)
+def count_corpus(corpus):
+    """품사별 단어 빈도, 품사간 연속 빈도, 시작 빈도를 계산
+
+    품사간 연속 빈도의 key는 (앞 품사, 뒤 품사) 튜플이다.
+    """
+    pos2words = {}
+    trans = {}
+    bos = {}
 
     # sent = [(word, tag), (word, tag), ...]
     for sent in corpus:
 
         # Count pos to words frequencies
         for word, pos in sent:
-            pos2words[pos][word] += 1
+            words = pos2words.setdefault(pos, {})
+            words[word] = words.get(word, 0) + 1
 
         # Count transition frequencies
-        for bigram in as_bigram_tag(sent):
-            trans[bigram] += 1
+        for (_, pos0), (_, pos1) in zip(sent, sent[1:]):
+            trans[(pos0, pos1)] = trans.get((pos0, pos1), 0) + 1
 
         # Count beginning pos frequencies
-        bos[sent[0][1]] += 1
+        bos[sent[0][1]] = bos.get(sent[0][1], 0) + 1
 
         # Count EOS frequencies
-        trans['_'.join([sent[-1][1], 'EOS'])] += 1
+        bigram = (sent[-1][1], 'EOS')
+        trans[bigram] = trans.get(bigram, 0) + 1
+
+    return pos2words, trans, bos
+
+def merge_counts(counts):
+    """count_corpus의 결과들을 합산. 앞의 결과부터 순서대로 합치므로
+    key의 순서는 말뭉치 전체를 한 번에 센 결과와 같다."""
+    pos2words, trans, bos = {}, {}, {}
+    for pos2words_, trans_, bos_ in counts:
+        for pos, words_ in pos2words_.items():
+            words = pos2words.setdefault(pos, {})
+            for word, count in words_.items():
+                words[word] = words.get(word, 0) + count
+        for bigram, count in trans_.items():
+            trans[bigram] = trans.get(bigram, 0) + count
+        for pos, count in bos_.items():
+            bos[pos] = bos.get(pos, 0) + count
+    return pos2words, trans, bos
+
+def _counts_to_json(pos2words, trans, bos):
+    return {
+        'emission': pos2words,
+        'transition': {'_'.join(bigram):count for bigram, count in trans.items()},
+        'begin': bos,
+    }
+
+def _counts_from_json(counts):
+    trans = {tuple(k.split("_")):v for k, v in counts['transition'].items()}
+    return counts['emission'], trans, counts['begin']
+
+def counts_path(model_path):
+    """모델과 함께 저장하는 빈도 파일의 위치 (model.json -> model.counts.json)"""
+    return os.path.splitext(model_path)[0] + '.counts.json'
+
+def save_counts(path, counts):
+    """update에 사용할 빈도(count_corpus의 결과)를 모델과 별도의 파일로 저장"""
+    with open(path, 'w') as f:
+        json.dump(_counts_to_json(*counts), f)
+
+def load_counts(path):
+    if not os.path.exists(path):
+        raise ValueError('Raw counts file %s not found. Retrain the model with the current train.py' % path)
+    with open(path, 'r') as f:
+        return _counts_from_json(json.load(f))
+
+def _model_stats(emission, transition):
+    """HMMTagger가 사용하는 모델 통계. 모델과 함께 저장하여 불러올 때 테이블을 순회하지 않음"""
+    return {
+        'max_word_len': max((len(word) for words in emission.values() for word in words), default=0),
+        'min_emission': min((score for words in emission.values() for score in words.values()), default=0.0),
+        'min_transition': min(transition.values(), default=0.0),
+    }
 
+def _as_trained(pos2words, trans, bos):
     pos2words_, transition_, bos_ = _to_log_prob(pos2words, trans, bos)
     trained = dict()
     trained['emission'] = pos2words_
     trained['transition'] = transition_
     trained['begin'] = bos_
+    trained['stats'] = _model_stats(pos2words_, transition_)
 
     return trained
 
+def train(corpus):
+    """말뭉치를 불러온 후 품사별 단어 빈도, 품사간 연속 빈도, 시작 빈도를 계산하여 리턴
+
+    corpus는 문장 리스트 또는 read_corpus(..., lazy=True)의 generator
+    """
+    return _as_trained(*count_corpus(corpus))
+
+def find_shards(data_path, num_shards):
+    """말뭉치 파일을 문장 경계(빈 줄)에서 나눈 (시작, 끝) byte 범위 리스트"""
+    size = os.path.getsize(data_path)
+    bounds = [0]
+    with open(data_path, 'rb') as f:
+        for i in range(1, num_shards):
+            target = max(size * i // num_shards, bounds[-1])
+            f.seek(target)
+            # 현재 줄의 나머지를 건너뛴 뒤 빈 줄이 나올 때까지 이동
+            if target > 0:
+                f.readline()
+            line = f.readline()
+            while line and line.strip(b'\r\n'):
+                line = f.readline()
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(b, e) for b, e in zip(bounds, bounds[1:]) if b < e]
+
+def _read_shard(data_path, begin, end):
+    with open(data_path, 'rb') as f:
+        f.seek(begin)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line.decode('utf-8').replace('\r\n', '\n')
+
+def _count_shard(shard):
+    data_path, begin, end = shard
+    return count_corpus(iter_sentences(_read_shard(data_path, begin, end)))
+
+def count_parallel(data_path, workers):
+    """말뭉치 파일을 workers개의 조각으로 나누어 프로세스별로 빈도를 센 뒤 합산"""
+    shards = [(data_path, b, e) for b, e in find_shards(data_path, workers)]
+    with Pool(workers) as pool:
+        counts = pool.map(_count_shard, shards)
+    return merge_counts(counts)
+
+def train_parallel(data_path, workers):
+    """count_parallel로 빈도를 세어 학습. train과 같은 결과를 리턴한다."""
+    return _as_trained(*count_parallel(data_path, workers))
+
+def update(trained, counts, new_counts):
+    """학습된 모델과 그 빈도(counts)에 새 말뭉치의 빈도(new_counts)를 합산
+
+    빈도가 바뀐 품사의 emission, 빈도가 바뀐 품사에서 시작하는 transition,
+    그리고 시작 확률만 다시 계산한다. 결과는 전체 말뭉치로 다시 학습한
+    모델과 같다. 리턴값은 (갱신한 모델, 합산한 빈도)
+    """
+    pos2words_new, trans_new, bos_new = new_counts
+    pos2words, trans, bos = merge_counts([counts, new_counts])
+
+    # 바뀐 분포만 다시 계산
+    emission = {
+        pos:_emission_log_prob(words) if pos in pos2words_new else trained['emission'][pos]
+        for pos, words in pos2words.items()
+    }
+    rows = {pos0 for pos0, _ in trans_new}
+    transition_ = _transition_log_prob(trans, rows)
+    transition = {}
+    for pos0, pos1 in trans:
+        key = '_'.join([pos0, pos1])
+        transition[key] = transition_[key] if pos0 in rows else trained['transition'][key]
+    begin = _emission_log_prob(bos) if bos_new else trained['begin']
+
+    updated = dict()
+    updated['emission'] = emission
+    updated['transition'] = transition
+    updated['begin'] = begin
+    updated['stats'] = _model_stats(emission, transition)
+
+    return updated, (pos2words, trans, bos)
+
 if __name__ == "__main__":
     args = parser.parse_args()
     data_path = args.data_path
     num_lines = args.num_lines
     save_path = args.save_path
+    workers = args.workers
 
     # 데이터 로드
     print("Data Loading...")
-    corpus = read_corpus(data_path, num_lines)
-    trained = train(corpus)
+    if args.shards_path:
+        from shards import count_shards
+        counts = count_shards(args.shards_path, workers)
+    elif workers > 1 and not num_lines:
+        counts = count_parallel(data_path, workers)
+    else:
+        # 문장을 파싱하는 대로 바로 학습에 사용 (코퍼스 전체를 메모리에 올리지 않음)
+        corpus = read_corpus(data_path, num_lines, lazy=True)
+        counts = count_corpus(corpus)
+
+    if args.update_path:
+        print("Model Updating...")
+        with open(args.update_path, 'r') as f:
+            trained = json.load(f)
+        trained, counts = update(trained, load_counts(counts_path(args.update_path)), counts)
+    else:
+        trained = _as_trained(*counts)
 
     print("Data Saving...")
     with open(save_path, 'w') as f:
         json.dump(trained, f)
+    # 이후 --update_path로 새 말뭉치를 반영할 수 있도록 빈도는 별도 파일에 저장
+    save_counts(counts_path(save_path), counts)
 
     print("Save finished.")
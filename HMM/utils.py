@@ -1,6 +1,56 @@
-from typing import List
+from itertools import islice
+from typing import Iterator, List
 
-def read_corpus(txt_path: str, num_lines: int = 0) -> List[tuple]:
+
+def parse_eojeols(sent_list: List) -> List[tuple]:
+    """어절 라인들을 (어절, [(형태소, 품사), ...]) 리스트로 변환"""
+    eojeols = []
+    for word in sent_list:
+        eojeol, tag_info = word.split('\t')[:2]
+        morphs = []
+        for tag in tag_info.split(' + '):
+            tag = tag.replace('\n','')
+            morphs.append((''.join(tag.split('/')[:-1]), tag.split('/')[-1]))
+        eojeols.append((eojeol, morphs))
+    return eojeols
+
+
+def parse_sentence(sent_list: List) -> List[tuple]:
+    """어절 라인들('어절\\t형태소/품사 + 형태소/품사\\n')을 (형태소, 품사) 리스트로 변환"""
+    return [morph for _, morphs in parse_eojeols(sent_list) for morph in morphs]
+
+
+def _iter_blocks(lines) -> Iterator[List[str]]:
+    """빈 줄로 구분된 문장의 어절 라인들을 하나씩 반환"""
+    sent = []
+    for s in lines:
+        if s == '\n':
+            if sent:
+                yield sent
+                sent = []
+        else:
+            sent.append(s)
+
+
+def iter_sentences(lines) -> Iterator[List[tuple]]:
+    """라인 iterable에서 빈 줄로 구분된 문장을 파싱하는 대로 하나씩 반환"""
+    return map(parse_sentence, _iter_blocks(lines))
+
+
+def iter_eojeol_sentences(lines) -> Iterator[List[tuple]]:
+    """iter_sentences와 같으나 문장을 [(어절, [(형태소, 품사), ...]), ...] 형태로 반환"""
+    return map(parse_eojeols, _iter_blocks(lines))
+
+
+def iter_corpus(txt_path: str, num_lines: int = 0) -> Iterator[List[tuple]]:
+    """read_corpus의 generator 버전. 파일 전체를 메모리에 올리지 않고
+    num_lines 라인까지만 읽는다."""
+    with open(txt_path, 'r') as f:
+        lines = islice(f, num_lines) if num_lines else f
+        yield from iter_sentences(lines)
+
+
+def read_corpus(txt_path: str, num_lines: int = 0, lazy: bool = False) -> List[tuple]:
     """클린 처리된 세종 코퍼스를 문장 단위로 다음과 같은 형태로 리턴하는 함수
 
         [('프랑스', 'Noun'),
@@ -24,48 +74,29 @@ def read_corpus(txt_path: str, num_lines: int = 0) -> List[tuple]:
     args:
         txt_path (str) : 전처리된 세종 코퍼스 txt 파일의 위치
         num_lines (int) : 세종 코퍼스에서 불러올 라인수. 0을 입력하면 전체를 불러온다.
+        lazy (bool) : True이면 리스트 대신 문장을 하나씩 반환하는 generator를 리턴한다.
     """
+    corpus = iter_corpus(txt_path, num_lines)
+    if lazy:
+        return corpus
+    return list(corpus)
 
-    def conv_sent_into_forms(sent_list: List) -> List[tuple]:
-        tag_infos = []
-        for word in sent_list:
-            tag_info = word.split('\t')[1]
-            tag_info = tag_info.split(' + ')
-            tag_infos.extend(tag_info)
-
-        sents = []
-        for tag in tag_infos:
-            tag = tag.replace('\n','')
-            word = ''.join(tag.split('/')[:-1])
-            pos = tag.split('/')[-1]
-            sents.append((word, pos))
 
-        return sents
+class Corpus:
+    """여러 번 순회할 수 있는 세종 코퍼스. 순회할 때마다 파일을 처음부터
+    스트리밍으로 읽으므로 전체 문장을 메모리에 올리지 않는다.
 
-    with open(txt_path, 'r') as f:
-        if num_lines:
-            raw_sents = f.readlines()[:num_lines]
-        else:
-            raw_sents = f.readlines()
-
-    corpus = []
-    sent = []
-
-    for s in raw_sents:
-        if s == '\n':
-            if sent:
-                corpus.append(conv_sent_into_forms(sent))
-                sent = []
-            else:
-                continue
-        else:
-            sent.append(s)
+    CRF Trainer처럼 코퍼스를 여러 번 읽어야 하는 경우에 사용한다.
+    """
+    def __init__(self, txt_path: str, num_lines: int = 0):
+        self.txt_path = txt_path
+        self.num_lines = num_lines
 
-    return corpus
+    def __iter__(self):
+        return iter_corpus(self.txt_path, self.num_lines)
 
 
 def as_bigram_tag(wordpos):
     """문장 sent에서 tag만 취하여 이를 bigram으로 묶음"""
     poslist = [pos for _, pos in wordpos]
     return ["_".join([pos0,pos1]) for pos0, pos1 in zip(poslist, poslist[1:])]
-
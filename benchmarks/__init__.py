@@ -0,0 +1,17 @@
+"""HMM 품사 판별기의 학습 / 모델 로드 / 품사 분석 성능 측정
+
+사용법:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --output new.json --compare bench.json
+    python -m benchmarks.evaluate --data_path data/corpus_type1_all.txt
+    python -m benchmarks.startup --output startup.json
+"""
+import os
+import sys
+
+# HMM / CRF 모듈들은 각 폴더를 기준으로 import하므로 경로에 추가
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for name in ('CRF', 'HMM'):
+    path = os.path.join(ROOT_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
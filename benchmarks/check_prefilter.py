@@ -0,0 +1,89 @@
+"""어간/어미 prefilter 회귀 확인
+
+prefilter를 사용한 HMMTagger와 사용하지 않은 HMMTagger가 모든 어절에 대해
+같은 lattice를 만드는지 비교하고, lemma_candidate 호출 수와 시간을 출력한다.
+모델과 문장을 지정하지 않으면 합성 말뭉치로 학습한 모델과 합성 문장을 사용한다.
+
+사용법:
+    python -m benchmarks.check_prefilter
+    python -m benchmarks.check_prefilter --json_path data/trained_corpus_type1.json
+                                         --input_path data/sentences.txt
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from benchmarks import synthetic
+
+from utils import read_corpus
+from train import train
+from HMM import HMMTagger, load_from_json, load_from_binary
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="어간/어미 prefilter 회귀 확인")
+
+# argument
+parser.add_argument('--json_path', type=str, default=None)
+parser.add_argument('--model_path', type=str, default=None, help='model.py로 변환한 바이너리 모델')
+parser.add_argument('--input_path', type=str, default=None, help='한 줄에 한 문장씩 들어있는 파일')
+parser.add_argument('--num_sents', type=int, default=5000, help='합성 말뭉치 문장 수')
+parser.add_argument('--num_tag_sents', type=int, default=1000, help='합성 문장 수')
+parser.add_argument('--vocab_size', type=int, default=5000)
+parser.add_argument('--seed', type=int, default=0)
+
+def load_tables(args):
+    if args.model_path:
+        model = load_from_binary(args.model_path)
+        return (model.emission, model.transition, model.begin), \
+            {'index': model.index, 'stats': model.stats}
+    if args.json_path:
+        return load_from_json(args.json_path), {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = os.path.join(tmp, 'corpus.txt')
+        synthetic.generate_corpus(
+            corpus_path, args.num_sents, vocab_size=args.vocab_size, seed=args.seed)
+        json_path = os.path.join(tmp, 'model.json')
+        with open(json_path, 'w') as f:
+            json.dump(train(read_corpus(corpus_path)), f)
+        return load_from_json(json_path), {}
+
+def load_eojeols(args):
+    if args.input_path:
+        with open(args.input_path, encoding='utf-8') as f:
+            sentences = [line.strip() for line in f]
+    else:
+        sentences = synthetic.generate_sentences(
+            args.num_tag_sents, 20, args.vocab_size, args.seed)
+    # 중복을 제거하되 등장 순서 유지
+    return list(dict.fromkeys(eojeol for sentence in sentences for eojeol in sentence.split()))
+
+def build_lattices(tagger, eojeols):
+    begin = time.perf_counter()
+    lattices = [tagger._build_eojeol_lattice(eojeol) for eojeol in eojeols]
+    return lattices, time.perf_counter() - begin
+
+def main(args):
+    tables, kwargs = load_tables(args)
+    eojeols = load_eojeols(args)
+
+    results = {}
+    for prefilter in (False, True):
+        tagger = HMMTagger(*tables, prefilter=prefilter, **kwargs)
+        lattices, elapsed = build_lattices(tagger, eojeols)
+        results[prefilter] = lattices
+        print('prefilter=%-5s lemma_candidate calls %9d  %8.3fs' % (
+            prefilter, tagger._lemma_attempts, elapsed))
+
+    mismatches = [eojeol for eojeol, expected, lattice in
+                  zip(eojeols, results[False], results[True]) if expected != lattice]
+    print('%d eojeols, %d mismatches' % (len(eojeols), len(mismatches)))
+    for eojeol in mismatches[:10]:
+        print('  ', eojeol)
+    return 1 if mismatches else 0
+
+if __name__ == '__main__':
+    sys.exit(main(parser.parse_args()))
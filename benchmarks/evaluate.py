@@ -0,0 +1,202 @@
+"""HMM / CRF 품사 판별기의 정확도 평가
+
+세종 말뭉치 파일을 문장 단위로 학습/평가 데이터로 나누어 두 모델을 학습하고,
+평가 문장을 process pool에서 품사 분석하여 형태소 단위 precision / recall / F1,
+어절 단위 정확도, 초당 문장 수, 문장별 지연 시간 분위수를 출력한다.
+
+HMM은 어절 원문을 입력받아 형태소 분석까지 수행하고, CRF는 정답 형태소열을
+입력받아 품사만 판별한다. 따라서 CRF의 형태소 precision / recall은 품사 정확도와 같다.
+
+사용법:
+    python -m benchmarks.evaluate --data_path data/corpus_type1_all.txt --test_ratio 0.1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from collections import Counter
+from itertools import islice
+
+from benchmarks.run import summarize
+
+from utils import iter_eojeol_sentences
+from train import train
+from HMM import HMMTagger
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="HMM / CRF 품사 판별기 정확도 평가")
+
+# argument
+parser.add_argument('--data_path', type=str, default='data/corpus_type1_all.txt')
+parser.add_argument('--num_lines', type=int, default=0)
+parser.add_argument('--test_ratio', type=float, default=0.1)
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--workers', type=int, default=0)
+parser.add_argument('--taggers', type=str, nargs='+', default=['hmm', 'crf'], choices=['hmm', 'crf'])
+parser.add_argument('--crf_features', type=str, default='base', choices=['base', 'hmm'])
+parser.add_argument('--crf_max_iter', type=int, default=100)
+parser.add_argument('--crf_min_count', type=int, default=3)
+parser.add_argument('--output', type=str, default=None, help='결과를 저장할 json 파일')
+
+# fork로 생성된 worker가 상속받는 분석 함수
+_worker_func = None
+
+def _run_chunk(chunk):
+    results = []
+    for x in chunk:
+        begin = time.perf_counter()
+        result = _worker_func(x)
+        results.append((result, time.perf_counter() - begin))
+    return results
+
+def run_parallel(func, inputs, workers, chunk_size=16):
+    """inputs를 process pool에서 func로 처리. 입력 순서대로 (결과 리스트,
+    입력별 지연 시간 리스트, 전체 소요 시간)을 리턴"""
+    global _worker_func
+
+    _worker_func = func
+    chunks = [inputs[i:i+chunk_size] for i in range(0, len(inputs), chunk_size)]
+    begin = time.perf_counter()
+    try:
+        if workers == 1:
+            outputs = [_run_chunk(chunk) for chunk in chunks]
+        else:
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(workers) as pool:
+                outputs = pool.map(_run_chunk, chunks)
+    finally:
+        _worker_func = None
+    elapsed = time.perf_counter() - begin
+
+    results = [result for output in outputs for result, _ in output]
+    latencies = [latency for output in outputs for _, latency in output]
+    return results, latencies, elapsed
+
+def split_corpus(data_path, num_lines, test_ratio, seed):
+    """문장 단위로 학습/평가 데이터를 나눔. 문장은 [(어절, [(형태소, 품사), ...]), ...]"""
+    rng = random.Random(seed)
+    train_sents, test_sents = [], []
+    with open(data_path, 'r') as f:
+        lines = islice(f, num_lines) if num_lines else f
+        for sentence in iter_eojeol_sentences(lines):
+            (test_sents if rng.random() < test_ratio else train_sents).append(sentence)
+    return train_sents, test_sents
+
+def flatten(sentence):
+    return [morph for _, morphs in sentence for morph in morphs]
+
+def score(golds, predictions):
+    """어절별 정답 / 예측 형태소열로 형태소 precision / recall / F1과 어절 정확도 계산
+
+    golds, predictions : 문장별 [[(형태소, 품사), ...] (어절별), ...]
+    """
+    matched = n_gold = n_pred = n_eojeol = n_correct = 0
+    for gold_sent, pred_sent in zip(golds, predictions):
+        for gold, pred in zip(gold_sent, pred_sent):
+            matched += sum((Counter(gold) & Counter(pred)).values())
+            n_gold += len(gold)
+            n_pred += len(pred)
+            n_eojeol += 1
+            n_correct += gold == pred
+    precision = matched / n_pred if n_pred else 0.0
+    recall = matched / n_gold if n_gold else 0.0
+    return {
+        'morph_precision': precision,
+        'morph_recall': recall,
+        'morph_f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'eojeol_accuracy': n_correct / n_eojeol if n_eojeol else 0.0,
+    }
+
+def group_by_eojeol(sentence, tagged):
+    """tag_with_offsets의 결과를 어절별로 나눔. 형태소는 시작 위치가 속한 어절에 배정"""
+    bounds = []
+    offset = 0
+    for eojeol, _ in sentence:
+        bounds.append(offset + len(eojeol))
+        offset += len(eojeol) + 1
+    grouped = [[] for _ in sentence]
+    i = 0
+    for morph, tag, begin, _ in tagged:
+        while i < len(bounds) - 1 and begin >= bounds[i]:
+            i += 1
+        grouped[i].append((morph, tag))
+    return grouped
+
+def evaluate_hmm(train_sents, test_sents, workers):
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'model.json')
+        with open(json_path, 'w') as f:
+            json.dump(train(flatten(sentence) for sentence in train_sents), f)
+        tagger = HMMTagger.from_json(json_path).prepare()
+
+    texts = [' '.join(eojeol for eojeol, _ in sentence) for sentence in test_sents]
+    results, latencies, elapsed = run_parallel(tagger.tag_with_offsets, texts, workers)
+    predictions = [group_by_eojeol(sentence, tagged)
+                   for sentence, tagged in zip(test_sents, results)]
+    return predictions, latencies, elapsed
+
+def evaluate_crf(train_sents, test_sents, workers, args):
+    from CRF import Trainer, TrainedCRFTagger, BaseFeatureTransformer, HMMStyleFeatureTransformer
+
+    transformer = {'base': BaseFeatureTransformer, 'hmm': HMMStyleFeatureTransformer}[args.crf_features]()
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, 'crf.json')
+        trainer = Trainer(sentence_to_xy=transformer, min_count=args.crf_min_count,
+                          max_iter=args.crf_max_iter, verbose=False, workers=workers,
+                          model_path=os.path.join(tmp, 'crfsuite_model'))
+        trainer.train([flatten(sentence) for sentence in train_sents])
+        trainer._save_as_json(json_path)
+        tagger = TrainedCRFTagger(json_path, feature_transformer=transformer)
+
+    words = [[morph for morph, _ in flatten(sentence)] for sentence in test_sents]
+    results, latencies, elapsed = run_parallel(tagger.tag, words, workers)
+
+    # 정답 형태소열의 어절 경계로 나눔
+    predictions = []
+    for sentence, tagged in zip(test_sents, results):
+        grouped, i = [], 0
+        for _, morphs in sentence:
+            grouped.append(tagged[i:i+len(morphs)])
+            i += len(morphs)
+        predictions.append(grouped)
+    return predictions, latencies, elapsed
+
+def main(args):
+    workers = args.workers or os.cpu_count() or 1
+    train_sents, test_sents = split_corpus(
+        args.data_path, args.num_lines, args.test_ratio, args.seed)
+    print('train %d sentences, test %d sentences' % (len(train_sents), len(test_sents)))
+    if not train_sents or not test_sents:
+        print('Not enough sentences to split')
+        return 1
+
+    golds = [[morphs for _, morphs in sentence] for sentence in test_sents]
+    results = {}
+    for name in args.taggers:
+        if name == 'hmm':
+            predictions, latencies, elapsed = evaluate_hmm(train_sents, test_sents, workers)
+        else:
+            predictions, latencies, elapsed = evaluate_crf(train_sents, test_sents, workers, args)
+        result = score(golds, predictions)
+        result['latency'] = summarize(latencies)
+        result['sentences_per_sec'] = len(test_sents) / elapsed if elapsed else 0.0
+        results[name] = result
+
+        print('%-4s morph P %.4f R %.4f F1 %.4f  eojeol acc %.4f  %8.1f sents/s  '
+              'p50 %7.3fms  p90 %7.3fms  p99 %7.3fms' % (
+                  name, result['morph_precision'], result['morph_recall'], result['morph_f1'],
+                  result['eojeol_accuracy'], result['sentences_per_sec'],
+                  result['latency']['p50_ms'], result['latency']['p90_ms'],
+                  result['latency']['p99_ms']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'workers': workers, 'results': results}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,243 @@
+"""HMM 학습 / 모델 로드 / 품사 분석 벤치마크
+
+합성 말뭉치를 생성하여 read_corpus, train, shard 변환 / 학습, load_from_json, HMMTagger.__init__,
+HMMTagger.tag (짧은/중간/아주 긴 문장), HMMTagger.tag_document (긴 문서)의 처리량, 지연 시간 분위수, 최대 메모리를
+측정하고 json으로 저장한다. --compare로 이전 결과를 지정하면 단계별로 비교한다.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+from collections import Counter
+
+from benchmarks import synthetic
+
+from utils import read_corpus
+from train import train, _as_trained
+from shards import convert_corpus, count_shards
+from HMM import HMMTagger, load_from_json
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="HMM 품사 판별기 벤치마크")
+
+# argument
+parser.add_argument('--num_sents', type=int, default=20000, help='학습 말뭉치 문장 수')
+parser.add_argument('--vocab_size', type=int, default=5000)
+parser.add_argument('--repeat', type=int, default=5, help='모델 로드 반복 횟수')
+parser.add_argument('--num_tag_sents', type=int, default=200, help='길이별 품사 분석 문장 수')
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--output', type=str, default=None, help='결과를 저장할 json 파일')
+parser.add_argument('--compare', type=str, default=None, help='비교할 이전 결과 json 파일')
+parser.add_argument('--threshold', type=float, default=0.1, help='회귀로 판단할 지연 시간 증가 비율')
+parser.add_argument('--document_eojeols', type=int, default=2000, help='문서 분석 벤치마크의 어절 수')
+parser.add_argument('--beam_widths', type=int, nargs='*', default=[1, 2, 4, 8],
+                    help='아주 긴 문장에 대해 exact decoding과 비교할 beam 크기')
+
+# 길이별 품사 분석 문장의 어절 수
+SENTENCE_LENGTHS = {'short': 5, 'medium': 20, 'long': 200}
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q / 100
+    f = int(k)
+    c = min(f + 1, len(values) - 1)
+    return values[f] + (values[c] - values[f]) * (k - f)
+
+def summarize(latencies, units=None):
+    """지연 시간(초) 리스트의 통계. units는 처리한 단위 수 (문장 수 등)"""
+    total = sum(latencies)
+    result = {
+        'count': len(latencies),
+        'total_sec': total,
+        'mean_ms': total / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': max(latencies) * 1000,
+    }
+    if units is not None:
+        result['throughput_per_sec'] = units / total if total else 0.0
+    return result
+
+def timed(func, *args):
+    begin = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - begin
+
+def peak_memory(func, *args):
+    """func 실행 중 python 할당 메모리의 최댓값 (MB)"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 / 1024
+
+def bench_training(corpus_path, json_path, repeat):
+    results = {}
+
+    corpus, elapsed = timed(read_corpus, corpus_path)
+    results['read_corpus'] = summarize([elapsed], units=len(corpus))
+    results['read_corpus']['peak_mb'] = peak_memory(read_corpus, corpus_path)
+
+    trained, elapsed = timed(train, corpus)
+    results['train'] = summarize([elapsed], units=len(corpus))
+    results['train']['peak_mb'] = peak_memory(train, corpus)
+
+    # 형태소 id shard로 한 번 변환한 뒤 텍스트 파싱 없이 학습
+    shards_path = os.path.join(os.path.dirname(json_path), 'shards')
+    _, elapsed = timed(convert_corpus, corpus_path, shards_path)
+    results['convert_corpus'] = summarize([elapsed], units=len(corpus))
+    train_shards = lambda: _as_trained(*count_shards(shards_path))
+    _, elapsed = timed(train_shards)
+    results['train_shards'] = summarize([elapsed], units=len(corpus))
+    results['train_shards']['peak_mb'] = peak_memory(train_shards)
+    results['convert_corpus']['peak_mb'] = peak_memory(convert_corpus, corpus_path, shards_path)
+
+    with open(json_path, 'w') as f:
+        json.dump(trained, f)
+
+    latencies = [timed(load_from_json, json_path)[1] for _ in range(repeat)]
+    results['load_from_json'] = summarize(latencies)
+    results['load_from_json']['peak_mb'] = peak_memory(load_from_json, json_path)
+
+    tables = load_from_json(json_path)
+    latencies = [timed(HMMTagger, *tables)[1] for _ in range(repeat)]
+    results['tagger_init'] = summarize(latencies)
+    results['tagger_init']['peak_mb'] = peak_memory(HMMTagger, *tables)
+
+    return results, tables
+
+def bench_tagging(tables, args):
+    results = {}
+    for name, num_eojeols in SENTENCE_LENGTHS.items():
+        # 아주 긴 문장은 개수를 줄임
+        num_sents = max(1, args.num_tag_sents // max(1, num_eojeols // 20))
+        sentences = synthetic.generate_sentences(
+            num_sents, num_eojeols, args.vocab_size, args.seed)
+
+        # 캐시의 영향을 배제하기 위해 길이별로 새 tagger 사용. 지연 초기화
+        # (soynlp import, 사전 index)는 측정 전에 prepare로 수행
+        tagger = HMMTagger(*tables).prepare()
+        latencies = [timed(tagger.tag, sentence)[1] for sentence in sentences]
+        results['tag_' + name] = summarize(latencies, units=len(sentences))
+        results['tag_' + name]['eojeols_per_sec'] = \
+            results['tag_' + name]['throughput_per_sec'] * num_eojeols
+        results['tag_' + name]['peak_mb'] = peak_memory(
+            HMMTagger(*tables).prepare().tag, sentences[0])
+    return results
+
+def bench_beam(tables, args):
+    """beam 크기별 아주 긴 문장의 품사 분석 지연 시간과 exact decoding과의 일치율
+
+    beam은 경로 탐색에만 적용되므로 지연 시간이 exact decoding보다 줄지 않을 수 있다.
+    """
+    results = {}
+    num_eojeols = SENTENCE_LENGTHS['long']
+    num_sents = max(1, args.num_tag_sents // max(1, num_eojeols // 20))
+    sentences = synthetic.generate_sentences(
+        num_sents, num_eojeols, args.vocab_size, args.seed)
+    exact = [HMMTagger(*tables).tag(sentence) for sentence in sentences]
+
+    for beam_width in args.beam_widths:
+        tagger = HMMTagger(*tables, beam_width=beam_width).prepare()
+        latencies, outputs = [], []
+        for sentence in sentences:
+            pos, elapsed = timed(tagger.tag, sentence)
+            latencies.append(elapsed)
+            outputs.append(pos)
+        stage = 'tag_long_beam%d' % beam_width
+        results[stage] = summarize(latencies, units=len(sentences))
+        results[stage]['peak_mb'] = peak_memory(
+            HMMTagger(*tables, beam_width=beam_width).prepare().tag, sentences[0])
+        # 형태소 단위 일치율 ((형태소, 품사) 중복 집합의 교집합 크기)
+        same = total = 0
+        for pos, pos_exact in zip(outputs, exact):
+            same += sum((Counter(pos) & Counter(pos_exact)).values())
+            total += max(len(pos), len(pos_exact))
+        results[stage]['agreement'] = same / total if total else 1.0
+    return results
+
+def bench_document(tables, args):
+    """아주 긴 문서를 tag로 한 번에 분석하는 경우와 tag_document로 나누어 분석하는 경우 비교"""
+    results = {}
+    document = synthetic.generate_sentences(
+        1, args.document_eojeols, args.vocab_size, args.seed)[0]
+    exact = HMMTagger(*tables).tag(document)
+
+    for stage, func in [('tag_doc_whole', lambda tagger: tagger.tag(document)),
+                        ('tag_doc_chunked', lambda tagger: [
+                            (morph, tag) for morph, tag, _, _ in tagger.tag_document(document)])]:
+        pos, elapsed = timed(func, HMMTagger(*tables).prepare())
+        results[stage] = summarize([elapsed], units=args.document_eojeols)
+        results[stage]['peak_mb'] = peak_memory(func, HMMTagger(*tables).prepare())
+        same = sum((Counter(pos) & Counter(exact)).values())
+        results[stage]['agreement'] = same / max(len(pos), len(exact)) if exact else 1.0
+    return results
+
+def compare(results, baseline, threshold):
+    """단계별 평균 지연 시간 비교. 회귀가 있으면 False"""
+    ok = True
+    print('%-16s %12s %12s %8s' % ('stage', 'baseline_ms', 'current_ms', 'ratio'))
+    for stage, stats in results['stages'].items():
+        if stage not in baseline['stages']:
+            continue
+        before = baseline['stages'][stage]['mean_ms']
+        after = stats['mean_ms']
+        ratio = after / before if before else float('inf')
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = 'REGRESSION'
+            ok = False
+        print('%-16s %12.3f %12.3f %8.2f %s' % (stage, before, after, ratio, mark))
+    return ok
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = os.path.join(tmp, 'corpus.txt')
+        json_path = os.path.join(tmp, 'model.json')
+        synthetic.generate_corpus(
+            corpus_path, args.num_sents, vocab_size=args.vocab_size, seed=args.seed)
+
+        stages, tables = bench_training(corpus_path, json_path, args.repeat)
+        stages.update(bench_tagging(tables, args))
+        stages.update(bench_beam(tables, args))
+        stages.update(bench_document(tables, args))
+
+    results = {
+        'config': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        # 프로세스 전체의 최대 RSS (MB, linux 기준)
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'stages': stages,
+    }
+
+    for stage, stats in stages.items():
+        print('%-16s mean %9.3fms  p50 %9.3fms  p99 %9.3fms  peak %8.1fMB%s' % (
+            stage, stats['mean_ms'], stats['p50_ms'], stats['p99_ms'], stats['peak_mb'],
+            '  agreement %.4f' % stats['agreement'] if 'agreement' in stats else ''))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""HMM / CRF 모듈 import 시간과 품사 분석 시작 시간 측정
+
+모델 형식(json / 바이너리 / compact)별로 새 python 프로세스를 실행하여
+모듈 import 시간, 모델 로드와 tagger 생성 시간, 첫 문장 분석 시간, 그리고
+프로세스 시작부터 첫 분석 결과까지의 전체 시간(time-to-first-tag)을 측정한다.
+모델을 지정하지 않으면 합성 말뭉치로 학습한 모델을 사용한다.
+
+사용법:
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --json_path data/trained_corpus_type1.json
+                                 --model_path data/trained_corpus_type1.bin
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks import ROOT_DIR, synthetic
+from benchmarks.run import summarize
+
+from utils import read_corpus
+from train import train
+from model import convert_json
+
+# Argparse setting
+parser = argparse.ArgumentParser(description="HMM / CRF 시작 시간 측정")
+
+# argument
+parser.add_argument('--json_path', type=str, default=None)
+parser.add_argument('--model_path', type=str, default=None, help='model.py로 변환한 바이너리 모델')
+parser.add_argument('--text', type=str, default='우리 집에서 라면 먹고 갈래')
+parser.add_argument('--repeat', type=int, default=5)
+parser.add_argument('--num_sents', type=int, default=20000, help='합성 말뭉치 문장 수')
+parser.add_argument('--vocab_size', type=int, default=5000)
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--output', type=str, default=None, help='결과를 저장할 json 파일')
+
+# 새 프로세스에서 실행하는 측정 코드. 단계별 소요 시간(초)을 json으로 출력
+CHILD = '''
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import HMM
+t1 = time.perf_counter()
+if sys.argv[2] == 'json':
+    tagger = HMM.HMMTagger.from_json(sys.argv[3])
+elif sys.argv[2] == 'binary':
+    tagger = HMM.HMMTagger.from_model(HMM.load_from_binary(sys.argv[3]))
+else:
+    tagger = HMM.HMMTagger.from_model(HMM.load_compact(sys.argv[3]))
+t2 = time.perf_counter()
+tagger.tag(sys.argv[4])
+t3 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'load': t2 - t1, 'first_tag': t3 - t2}))
+'''
+
+def measure_import(module, path):
+    """module을 import하는 데 걸린 시간 (초)"""
+    code = ('import sys, time; sys.path.insert(0, %r); t = time.perf_counter(); '
+            'import %s; print(time.perf_counter() - t)' % (path, module))
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return float(output)
+
+def measure_tagger(kind, path, text):
+    """새 프로세스에서 tagger를 만들어 첫 문장을 분석. 단계별 시간과 전체 시간 (초)"""
+    begin = time.perf_counter()
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD, os.path.join(ROOT_DIR, 'HMM'), kind, path, text])
+    result = json.loads(output)
+    result['time_to_first_tag'] = time.perf_counter() - begin
+    return result
+
+def prepare_models(args, tmp):
+    json_path = args.json_path
+    if json_path is None:
+        corpus_path = os.path.join(tmp, 'corpus.txt')
+        synthetic.generate_corpus(
+            corpus_path, args.num_sents, vocab_size=args.vocab_size, seed=args.seed)
+        json_path = os.path.join(tmp, 'model.json')
+        with open(json_path, 'w') as f:
+            json.dump(train(read_corpus(corpus_path)), f)
+    model_path = args.model_path
+    if model_path is None:
+        model_path = os.path.join(tmp, 'model.bin')
+        convert_json(json_path, model_path)
+    return {'json': json_path, 'binary': model_path, 'compact': model_path}
+
+def main(args):
+    stages = {}
+    for module in ('HMM', 'CRF'):
+        path = os.path.join(ROOT_DIR, module)
+        latencies = [measure_import(module, path) for _ in range(args.repeat)]
+        stages['import_' + module] = summarize(latencies)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        models = prepare_models(args, tmp)
+        for kind, path in models.items():
+            results = [measure_tagger(kind, path, args.text) for _ in range(args.repeat)]
+            for name in ('load', 'first_tag', 'time_to_first_tag'):
+                stages['%s_%s' % (kind, name)] = summarize([r[name] for r in results])
+
+    for stage, stats in stages.items():
+        print('%-26s mean %9.3fms  p50 %9.3fms  max %9.3fms' % (
+            stage, stats['mean_ms'], stats['p50_ms'], stats['max_ms']))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': vars(args), 'stages': stages}, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(parser.parse_args()))
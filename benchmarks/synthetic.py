@@ -0,0 +1,58 @@
+"""세종 말뭉치 형식('어절\t형태소/품사 + 형태소/품사')의 합성 말뭉치 생성기"""
+import random
+
+# 자주 쓰이는 음절
+SYLLABLES = '가나다라마바사아자차카타파하고노도로모보소오조초코토포호구누두루무부수우주추쿠투푸후기니디리미비시이지치키티피히'
+
+JOSA = ['이', '가', '은', '는', '을', '를', '에', '에서', '으로', '로', '의', '와', '과', '도', '만']
+EOMI = ['다', '고', '어', '아', '었다', '았다', '는', '은', '을', '게', '지', '면', '서', '니다']
+
+# 어절을 구성하는 품사 패턴과 등장 비율
+PATTERNS = [
+    (('Noun', 'Josa'), 35),
+    (('Noun',), 20),
+    (('Verb', 'Eomi'), 20),
+    (('Adjective', 'Eomi'), 8),
+    (('Pronoun', 'Josa'), 7),
+    (('Adverb',), 6),
+    (('Determiner',), 4),
+]
+
+class SyntheticVocabulary:
+    """품사별 단어 목록. Josa/Eomi는 고정 목록, 나머지는 임의 음절 조합"""
+    def __init__(self, vocab_size=5000, seed=0):
+        rng = random.Random(seed)
+        self.words = {'Josa': JOSA, 'Eomi': EOMI}
+        for tag, ratio in [('Noun', 0.6), ('Verb', 0.15), ('Adjective', 0.1),
+                           ('Pronoun', 0.01), ('Adverb', 0.1), ('Determiner', 0.04)]:
+            words = set()
+            size = max(5, int(vocab_size * ratio))
+            while len(words) < size:
+                length = rng.choice([1, 2, 2, 2, 3, 3, 4])
+                words.add(''.join(rng.choice(SYLLABLES) for _ in range(length)))
+            self.words[tag] = sorted(words)
+
+    def eojeol(self, rng):
+        """(어절, [(형태소, 품사), ...])"""
+        patterns, weights = zip(*PATTERNS)
+        pattern = rng.choices(patterns, weights)[0]
+        morphs = [(rng.choice(self.words[tag]), tag) for tag in pattern]
+        return ''.join(m for m, _ in morphs), morphs
+
+def generate_corpus(path, num_sents=10000, min_len=3, max_len=20, vocab_size=5000, seed=0):
+    """num_sents개의 문장을 가진 합성 말뭉치를 path에 저장"""
+    rng = random.Random(seed)
+    vocab = SyntheticVocabulary(vocab_size, seed)
+    with open(path, 'w') as f:
+        for _ in range(num_sents):
+            for _ in range(rng.randint(min_len, max_len)):
+                surface, morphs = vocab.eojeol(rng)
+                f.write('%s\t%s\n' % (surface, ' + '.join('%s/%s' % m for m in morphs)))
+            f.write('\n')
+
+def generate_sentences(num_sents, num_eojeols, vocab_size=5000, seed=0):
+    """품사 분석용 문장 (어절 num_eojeols개를 띄어쓰기로 연결)"""
+    rng = random.Random(seed + 1)
+    vocab = SyntheticVocabulary(vocab_size, seed)
+    return [' '.join(vocab.eojeol(rng)[0] for _ in range(num_eojeols))
+            for _ in range(num_sents)]